@@ -0,0 +1,107 @@
+import argparse
+import csv
+import random
+
+from modules.parser import DependencyParser
+from modules.schema import AIRLINES, COLUMNS, format_time
+
+
+def surface_form(lexeme):
+    # 'đà_nẵng' -> 'Đà Nẵng', 'tp.hồ_chí_minh' -> 'Tp.Hồ Chí Minh'
+    return ' '.join('.'.join(part[:1].upper() + part[1:] for part in word.split('.'))
+                    for word in lexeme.split('_'))
+
+
+def city_names():
+    cities = {}
+    for name in DependencyParser.NAMES:
+        code = DependencyParser.NAMES_MAPPER.get(name)
+        if code and code not in AIRLINES:
+            cities.setdefault(code, []).append(surface_form(name))
+    return cities
+
+
+class QuestionGenerator(object):
+    # one template per question shape the parser understands, see input/queries.txt
+    TEMPLATES = [
+        'Máy bay nào {to} thành phố {city} lúc {time}HR ?',
+        'Máy bay nào bay từ {city} {to} {city2} mất {hours} giờ ?',
+        'Hãy {wh_tell} mã hiệu các Máy bay hạ cánh ở {city} ?',
+        'Máy bay nào xuất phát từ {city}, lúc {wh_time} ?',
+        'Máy bay nào bay từ {city} {to} {city2} ?',
+        'Máy bay {flight} có xuất phát từ {city} không ?',
+        'Thời gian Máy bay {flight} bay từ {city} {to} {city2} mất {wh_time} ?',
+        'Có Máy bay nào xuất phát từ {city} không ?',
+        'Máy bay của hãng hàng không VietJet Air bay {to} những thành phố nào ?',
+        'Có Máy bay nào bay từ {city} {to} {city2} không ?'
+    ]
+
+    def __init__(self, seed=0, flights=None):
+        self.random = random.Random(seed)
+        self.cities = [names for code, names in sorted(city_names().items())]
+        self.flights = flights or ['VN{}'.format(i) for i in range(1, 6)] + \
+            ['VJ{}'.format(i) for i in range(1, 6)]
+        self.to_words = DependencyParser.TO
+        self.wh_tell = [word.replace('_', ' ') for word in DependencyParser.WH_WORDS
+                        if word.startswith('cho')]
+        self.wh_time = [word.replace('_', ' ') for word in DependencyParser.WH_WORDS
+                        if word.endswith('giờ')]
+
+    def question(self):
+        template = self.random.choice(self.TEMPLATES)
+        # two different places, each spelled with any of its surface forms
+        places = self.random.sample(self.cities, 2)
+        city, city2 = [self.random.choice(names) for names in places]
+        return template.format(
+            to=self.random.choice(self.to_words),
+            city=city,
+            city2=city2,
+            time=format_time(self.random.randrange(24 * 60)),
+            hours=self.random.randrange(1, 10),
+            wh_tell=self.random.choice(self.wh_tell),
+            wh_time=self.random.choice(self.wh_time),
+            flight=self.random.choice(self.flights)
+        )
+
+    def questions(self, count):
+        for _ in range(count):
+            yield self.question()
+
+
+def generate_flights(rows, seed=0, airlines=('VN', 'VJ')):
+    rng = random.Random(seed)
+    places = sorted(city_names())
+    for idx in range(rows):
+        source, dest = rng.sample(places, 2)
+        runtime = rng.choice([30, 45, 60, 90, 120, 150])
+        departure = rng.randrange(24 * 60 - runtime)
+        yield {
+            'FLIGHT': '{}{}'.format(airlines[idx % len(airlines)], idx // len(airlines) + 1),
+            'DTIME': format_time(departure),
+            'ATIME': format_time(departure + runtime),
+            'RUNTIME': format_time(runtime),
+            'SOURCE': source,
+            'DEST': dest
+        }
+
+
+def write_flights(path, rows, seed=0):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(generate_flights(rows, seed))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Generate synthetic questions or flights')
+    arg_parser.add_argument('kind', choices=['questions', 'flights'])
+    arg_parser.add_argument('count', type=int)
+    arg_parser.add_argument('output')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    if args.kind == 'flights':
+        write_flights(args.output, args.count, args.seed)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for question in QuestionGenerator(args.seed).questions(args.count):
+                f.write(question + '\n')
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import QuestionAnswering
+from modules.cache import LRUCache
+from modules.database import FlightStore
+from modules.metrics import Histogram, StageMetrics
+from modules.snapshot import open_snapshot, write_snapshot
+
+from .generate import QuestionGenerator, write_flights
+
+DEFAULT_SCALES = [10, 1000, 100000]
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _disable_caches(qa):
+    # measure the real work, not the memoized answers of repeated questions
+    qa.tokenizer.cache = LRUCache(0)
+    qa.planner.cache = LRUCache(0)
+    qa.answer_cache = LRUCache(0)
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_pipeline(database_path, questions, cache=False, tokenizer_backend='underthesea'):
+    metrics = StageMetrics()
+    qa = QuestionAnswering(database_path=database_path, metrics=metrics,
+                           tokenizer_backend=tokenizer_backend)
+    if not cache:
+        _disable_caches(qa)
+    qa.warm_up()
+    metrics.reset()
+
+    answered = []
+    errors = 0
+    start = time.perf_counter()
+    for question in questions:
+        try:
+            output = qa.answer(question)
+        except Exception:
+            errors += 1
+            continue
+        answered.append(output['procedural_semantics'])
+    elapsed = time.perf_counter() - start
+    return {
+        'questions': len(questions),
+        'errors': errors,
+        'seconds': elapsed,
+        'questions_per_second': len(questions) / elapsed if elapsed else 0.0,
+        'stages': metrics.snapshot()
+    }, answered
+
+
+def bench_database(rows, procedural_semantics, workdir, seed=0, repeat=3):
+    csv_path = os.path.join(workdir, 'flights_{}.csv'.format(rows))
+    snapshot_path = os.path.join(workdir, 'flights_{}.snapshot'.format(rows))
+    _, generate_seconds = _timed(write_flights, csv_path, rows, seed)
+    store, csv_seconds = _timed(FlightStore.from_csv, csv_path)
+    _, write_seconds = _timed(write_snapshot, store, snapshot_path)
+    store, open_seconds = _timed(open_snapshot, snapshot_path)
+
+    qa = QuestionAnswering(database_path=csv_path)
+    _disable_caches(qa)
+    qa.database = store
+    histogram = Histogram()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for p_sems in procedural_semantics:
+            _, seconds = _timed(qa.query_database, p_sems)
+            histogram.observe(seconds)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'generate_csv_seconds': generate_seconds,
+        'load_csv_seconds': csv_seconds,
+        'write_snapshot_seconds': write_seconds,
+        'open_snapshot_seconds': open_seconds,
+        'snapshot_bytes': os.path.getsize(snapshot_path),
+        'queries_per_second': histogram.count / elapsed if elapsed else 0.0,
+        'query': histogram.summary()
+    }
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = '{}.{}'.format(prefix, key) if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    old = _flatten(baseline['results'])
+    new = _flatten(current['results'])
+    lines = ['{:<60} {:>14} {:>14} {:>8}'.format('metric', 'baseline', 'current', 'ratio')]
+    for name in sorted(set(old) & set(new)):
+        ratio = new[name] / old[name] if old[name] else float('nan')
+        lines.append('{:<60} {:>14.6g} {:>14.6g} {:>8.2f}'.format(name, old[name], new[name],
+                                                                 ratio))
+    return '\n'.join(lines)
+
+
+def run(questions=1000, scales=DEFAULT_SCALES, seed=0, cache=False,
+        database_path=os.path.join('input', 'database.csv'), tokenizer_backend='underthesea'):
+    generated = list(QuestionGenerator(seed).questions(questions))
+    pipeline, procedural_semantics = bench_pipeline(database_path, generated, cache,
+                                                    tokenizer_backend)
+    databases = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in scales:
+            databases[str(rows)] = bench_database(rows, procedural_semantics, workdir, seed)
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': seed,
+            'questions': questions,
+            'scales': scales,
+            'cache': cache,
+            'tokenizer': tokenizer_backend
+        },
+        'results': {
+            'pipeline': pipeline,
+            'database': databases
+        }
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark every pipeline stage')
+    arg_parser.add_argument('--questions', type=int, default=1000)
+    arg_parser.add_argument('--scales', default=','.join(str(rows) for rows in DEFAULT_SCALES),
+                            help='comma separated flight table sizes, up to 10000000')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--cache', action='store_true',
+                            help='keep the tokenizer, plan and answer caches enabled')
+    arg_parser.add_argument('--tokenizer', choices=['underthesea', 'trie'], default='underthesea')
+    arg_parser.add_argument('--save', default=None, help='write the results as a JSON baseline')
+    arg_parser.add_argument('--compare', default=None, help='baseline JSON to compare against')
+    args = arg_parser.parse_args()
+
+    current = run(args.questions, [int(rows) for rows in args.scales.split(',')], args.seed,
+                  args.cache, tokenizer_backend=args.tokenizer)
+    print(json.dumps(current, indent=2, ensure_ascii=False))
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print(compare(json.load(f), current))
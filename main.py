@@ -1,23 +1,107 @@
+import argparse
+import contextlib
+import itertools
+import multiprocessing
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import pandas as pd
-
+from modules import startup
+from modules.answer import Answer, AnswerError, QueryResult
+from modules.cache import LRUCache
+from modules.metrics import StageMetrics, StageTimings
 from modules.parser import DependencyParser
-from modules.semantics import OpProceduralSemantic
+from modules.plan import QueryPlanner
+from modules.schema import AIRLINES
 from modules.tokenizer import Tokenizer
 
 
 class QuestionAnswering(object):
 
-    def __init__(self, database_path):
-        self.tokenizer = Tokenizer()
-        self.parser = DependencyParser()
-        self.database = pd.read_csv(database_path)
-        self.database['ATIME'] = self.database['ATIME'].astype(str)
-        self.database['DTIME'] = self.database['DTIME'].astype(str)
-        self.database['RUNTIME'] = self.database['RUNTIME'].astype(str)
+    def __init__(self, database_path, answer_cache_size=4096, metrics=None, max_rows=None,
+                 reload_interval=None, delta_dir=None, tokenizer_backend='underthesea',
+                 lexicon_path=None, parse_cache_path=None, parse_cache_size=100000,
+                 sql_database_path=None, parser_class=DependencyParser):
+        if sql_database_path is not None and (reload_interval is not None or delta_dir):
+            # the SQLite copy is only rebuilt at startup, it never sees reloads or deltas
+            raise ValueError('sql_database_path cannot be combined with reload_interval '
+                             'or delta_dir')
+        self.database_path = database_path
+        # default cap on the rows rendered into one answer, None renders them all
+        self.max_rows = max_rows
+        # optional StageMetrics; when None every stage of answer() is a no-op context
+        self.metrics = metrics
+        # parser_class may be a DependencyParser subclass with load_gazetteer() or
+        # load_relation_rules() applied; the trie tokenizer reads the same vocabularies
+        self.tokenizer = Tokenizer(backend=tokenizer_backend, lexicon_path=lexicon_path,
+                                   parser_class=parser_class)
+        self.parser = parser_class()
+        # optional SQLite cache of the parse artefacts, shared by runs and worker processes
+        self.parse_cache_path = parse_cache_path
+        self.parse_cache_size = parse_cache_size
+        self.parse_cache = None
+        if parse_cache_path is not None:
+            parse_cache = startup.lazy_import('modules.parse_cache')
+            self.parse_cache = parse_cache.ParseCache(
+                parse_cache_path,
+                parse_cache.rules_key(self.tokenizer.rules_fingerprint(),
+                                      self.parser.rules_fingerprint()),
+                parse_cache_size)
+        self.planner = QueryPlanner(AIRLINES)
+        self.answer_cache = LRUCache(answer_cache_size)
+        self.database_version = 0
+        # when reload_interval is set, lookups poll the CSV and the delta files that often
+        self.reload_interval = reload_interval
+        self.delta_dir = delta_dir
+        self.reloader = None
+        # when set, lookups run as SQL against this indexed SQLite copy of the CSV
+        self.sql_database_path = sql_database_path
+        self.load_database(database_path)
+
+    @property
+    def database(self):
+        # the flight store (and numpy with it) is only loaded by the first lookup
+        if self._database is None and self.sql_database_path is not None:
+            sql_store = startup.lazy_import('modules.sql_store')
+            self._database = sql_store.open_sql_store(self.database_path,
+                                                      self.sql_database_path)
+        elif self._database is None:
+            reload = startup.lazy_import('modules.reload')
+            self.reloader = reload.DatabaseReloader(self.database_path, self.delta_dir,
+                                                    self.reload_interval)
+            self._database = self.reloader.load()
+        elif self.reloader is not None and self.reloader.interval is not None:
+            updated = self.reloader.poll(self._database)
+            if updated is not None:
+                self.database = updated
+        return self._database
+
+    @database.setter
+    def database(self, database):
+        # any change of the flight table invalidates the cached answers; queries that
+        # already hold the old store finish on it
+        self._database = database
+        self.database_version += 1
+        self.answer_cache.clear()
 
-    def decode_result(self, result, command):
+    def load_database(self, database_path):
+        self.database_path = database_path
+        self.reloader = None
+        self.database = None
+
+    def reload_database(self):
+        # check the CSV and the delta files now instead of waiting for the next poll
+        if self._database is None or self.reloader is None:
+            return self.database
+        updated = self.reloader.poll(self._database, force=True)
+        if updated is not None:
+            self.database = updated
+        return self._database
+
+    @staticmethod
+    def decode_result(result, command, limit=None, offset=0):
+        # static, so a detached QueryResult (see Answer pickling) renders without this instance
         if command[0].startswith('PRINT-YES-NO'):
             if result.empty:
                 return 'Không'
@@ -26,120 +110,331 @@ class QuestionAnswering(object):
         if result.empty:
             return 'Dạ thưa, không tìm thấy kết quả phù hợp'
         prompt = 'Dạ thưa, kết quả câu hỏi là:'
+        if offset >= len(result) or limit == 0:
+            # an empty page; checked on the total, which is already counted
+            return 'Dạ thưa, không tìm thấy kết quả phù hợp'
+        page = result.page(offset, limit) if limit is not None or offset else result
         if command[0].startswith('PRINT-ALL'):
+            time_column = command[2] if command[2] in ['ATIME', 'DTIME'] else 'RUNTIME'
             if command[1] == '?f1':
-                template = "{prompt} máy bay {flight}"
-                flights = result['FLIGHT'].tolist()
-                flight = ','.join(flights)
-                return template.format(prompt=prompt, flight=flight)
+                text = '{} máy bay {}'.format(prompt, ','.join(page['FLIGHT']))
             elif command[1] == '?t1':
-                template = "{prompt} {time}"
-                if command[2] == 'ATIME':
-                    times = result['ATIME'].tolist()
-                elif command[2] == 'DTIME':
-                    times = result['DTIME'].tolist()
-                else:
-                    times = result['RUNTIME'].tolist()
-                time = ','.join(times)
-                return template.format(prompt=prompt, time=time)
+                text = '{} {}'.format(prompt, ','.join(page.formatted(time_column)))
             elif command[1] == '?f1 ?t1':
-                template = "máy bay {flight}, thời gian {time}\n"
-                for idx, row in result.iterrows():
-                    flight = row['FLIGHT']
-                    if command[2] == 'ATIME':
-                        time = row['ATIME']
-                    elif command[2] == 'DTIME':
-                        time = row['DTIME']
-                    else:
-                        time = row['RUNTIME']
-                    prompt += template.format(flight=flight, time=time)
-                return prompt
+                template = "máy bay {}, thời gian {}\n"
+                text = prompt + ''.join([template.format(flight, time) for flight, time in
+                                         zip(page['FLIGHT'], page.formatted(time_column))])
             elif command[1] == '?d1':
-                template = "thành phố {place}\n"
-                for idx, row in result.iterrows():
-                    if command[2] == 'ATIME':
-                        place = row['DEST']
-                    elif command[2] == 'DTIME':
-                        place = row['SOURCE']
-                    prompt += template.format(place=place)
-                return prompt
-
-    def query_database(self, procedural_semantics):
-        query_procedure = procedural_semantics[0]
-        always_true_condition = self.database['FLIGHT'] == self.database['FLIGHT']
-        if isinstance(procedural_semantics[1], OpProceduralSemantic):
-            condition = procedural_semantics[1].p_sems[1]
-        else:
-            condition = procedural_semantics[1]
-        if 'hr' in condition.time.lower():
-            condition.time = condition.time.lower().replace('hr', '')
-        if condition.flight == 'VJ':
-            self.database_query = self.database[
-                self.database['FLIGHT'].str.contains(condition.flight)]
-        else:
-            self.database_query = self.database
-        query_result = self.database_query[
-            (self.database_query[
-                 'FLIGHT'] == condition.flight if condition.flight and condition.flight != 'VJ' else always_true_condition) &
-            (self.database_query[
-                 'ATIME'] == condition.time if condition.time != '?t1' and condition.type == 'ATIME' else always_true_condition) &
-            (self.database_query[
-                 'DTIME'] == condition.time if condition.time != '?t1' and condition.type == 'DTIME' else always_true_condition) &
-            (self.database_query[
-                 'RUNTIME'] == condition.time if condition.time != '?t1' and condition.type == 'RUNTIME' else always_true_condition) &
-            (self.database_query[
-                 'SOURCE'] == condition.start_place if condition.start_place else always_true_condition) &
-            (self.database_query[
-                 'DEST'] == condition.end_place if condition.end_place else always_true_condition)
-            ]
-
-        return self.decode_result(query_result,
-                                  (query_procedure.type, query_procedure.object, condition.type))
-
-    def answer(self, question):
-        tokens = self.tokenizer.tokenize(question)
-        relations = self.parser.parse(tokens)
-        grammars = self.parser.construct_grammar(relations)
-        logical_forms = self.parser.construct_logical_form(grammars)
-        procedural_semantics = self.parser.construct_procedural_semantic(logical_forms)
-        output_str = self.query_database(procedural_semantics)
-        return {
-            'relations': relations,
-            'grammatical_relations': grammars,
-            'logical_forms': logical_forms,
-            'procedural_semantics': procedural_semantics,
-            'output': output_str
-        }
+                place_column = {'ATIME': 'DEST', 'DTIME': 'SOURCE'}[command[2]]
+                text = prompt + ''.join(['thành phố {}\n'.format(place)
+                                         for place in page[place_column]])
+            else:
+                return None
+            if len(page) < len(result):
+                text += '\n(hiển thị {}-{} trên tổng số {} kết quả)'.format(
+                    offset + 1, offset + len(page), len(result))
+            return text
+
+    def query_database(self, procedural_semantics, limit=None, offset=0):
+        if limit is None:
+            limit = self.max_rows
+        return self._query(procedural_semantics).text(limit, offset)
+
+    def _query(self, procedural_semantics):
+        return self.query_plan(self.planner.compile(procedural_semantics))
+
+    def query_plan(self, plan):
+        # read the store before the version: a reload swaps the store first
+        database = self.database
+        # paraphrases share the same procedural semantic, so they share the matched rows;
+        # each page of prose is rendered from them on demand
+        cache_key = (self.database_version, plan.key)
+        result = self.answer_cache.get(cache_key)
+        if result is None:
+            result = QueryResult(plan, plan.execute(database), self.decode_result)
+            if self._database is database:
+                self.answer_cache.put(cache_key, result)
+        return result
+
+    def _stage(self, name):
+        # times one stage of answer() into self.metrics; a shared no-op when metrics is None
+        if self.metrics is None:
+            return _UNTIMED
+        return _timed_stage(self.metrics, name)
+
+    def _cached_parse(self, question):
+        if self.parse_cache is None:
+            return None
+        start = time.perf_counter()
+        artefacts = self.parse_cache.get(self.tokenizer.normalize(question))
+        if artefacts is not None and self.metrics is not None:
+            # only hits are a stage of their own; a miss is paid for by the front end below
+            self.metrics.observe('parse_cache', time.perf_counter() - start)
+        return artefacts
+
+    def _store_parse(self, question, artefacts):
+        if self.parse_cache is not None:
+            self.parse_cache.put(self.tokenizer.normalize(question), artefacts)
+
+    def parse(self, question):
+        # the NLP front end; a persistent cache hit skips it entirely
+        artefacts = self._cached_parse(question)
+        if artefacts is None:
+            with self._stage('tokenize'):
+                tokens = self.tokenizer.tokenize(question)
+            with self._stage('parse'):
+                relations = self.parser.parse(tokens)
+            with self._stage('construct_grammar'):
+                grammars = self.parser.construct_grammar(relations)
+            with self._stage('construct_logical_form'):
+                logical_forms = self.parser.construct_logical_form(grammars)
+            with self._stage('construct_procedural_semantic'):
+                procedural_semantics = self.parser.construct_procedural_semantic(logical_forms)
+            artefacts = (relations, grammars, logical_forms, procedural_semantics)
+            self._store_parse(question, artefacts)
+        return artefacts
+
+    def answer(self, question, limit=None, offset=0):
+        with self._stage('total'):
+            artefacts = self.parse(question)
+            with self._stage('query_database'):
+                result = self._query(artefacts[3])
+        startup.mark('first answer')
+        return Answer(*artefacts, result, self.max_rows if limit is None else limit, offset)
+
+    def answer_or_error(self, question, limit=None, offset=0):
+        # for streams: a question the parser cannot handle becomes an AnswerError
+        try:
+            return self.answer(question, limit, offset)
+        except Exception as e:
+            return AnswerError(question, e)
+
+    def answer_structured(self, question, limit=None, offset=0):
+        return self.answer(question, limit, offset).structured()
+
+    def warm_up(self, front_end=True):
+        # load the flight store, the segmenter and the parser tables before the first real
+        # request; worker processes hold their own front end, so they only need the store
+        self.database
+        if front_end:
+            self.parser.parse(self.tokenizer.tokenize('Máy bay nào bay đến Huế ?'))
+
+    def answer_many(self, questions, workers=1, chunksize=None):
+        questions = list(questions)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(questions))
+        if workers <= 1:
+            return [self.answer(question) for question in questions]
+        if chunksize is None:
+            # a few chunks per worker keeps the pool balanced without paying
+            # the IPC round trip for every single question
+            chunksize = max(1, len(questions) // (workers * 4))
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=self._worker_args(timed=True)) as pool:
+            return self._replay_timings(pool.map(_answer_in_worker, questions, chunksize))
+
+    def process_executor(self, workers=None):
+        # worker processes that each hold their own front end, for async_api()
+        return ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=self._worker_args())
+
+    def async_api(self, executor=None, backend=None, max_concurrency=64):
+        async_api = startup.lazy_import('modules.async_api')
+        # a process pool cannot call self.parse, so it parses with its own instances
+        parse = _parse_in_worker if isinstance(executor, ProcessPoolExecutor) else self.parse
+        return async_api.AsyncQuestionAnswering(self, parse, executor, backend, max_concurrency)
+
+    def _worker_args(self, timed=False):
+        # timed workers send the stage timings of every answer back, see _replay_timings
+        return (self.database_path, self.max_rows, self.reload_interval, self.delta_dir,
+                self.tokenizer.backend, self.tokenizer.lexicon_path, self.parse_cache_path,
+                self.parse_cache_size, self.sql_database_path,
+                timed and self.metrics is not None, type(self.parser))
+
+    def _replay_timings(self, results):
+        # (output, timings) pairs from the workers; their timings go into self.metrics
+        outputs = []
+        for output, timings in results:
+            if timings:
+                self.metrics.replay(timings)
+            outputs.append(output)
+        return outputs
+
+    def answer_stream(self, questions, workers=1, batch_size=1024):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for question in questions:
+                yield self.answer_or_error(question)
+            return
+        # only two batches are in flight at a time, so memory does not depend on the input size
+        questions = iter(questions)
+        chunksize = max(1, batch_size // (workers * 4))
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=self._worker_args(timed=True)) as pool:
+            batch = list(itertools.islice(questions, batch_size))
+            pending = pool.map_async(_answer_or_error_in_worker, batch, chunksize) \
+                if batch else None
+            while pending is not None:
+                batch = list(itertools.islice(questions, batch_size))
+                next_pending = pool.map_async(_answer_or_error_in_worker, batch, chunksize) \
+                    if batch else None
+                yield from self._replay_timings(pending.get())
+                pending = next_pending
+
+
+@contextlib.contextmanager
+def _timed_stage(metrics, name):
+    start = time.perf_counter()
+    yield
+    metrics.observe(name, time.perf_counter() - start)
+
+
+_UNTIMED = contextlib.nullcontext()
+
+# each pool process builds its own tokenizer, parser and database once
+_worker_qa = None
+
+
+def _init_worker(database_path, max_rows=None, reload_interval=None, delta_dir=None,
+                 tokenizer_backend='underthesea', lexicon_path=None, parse_cache_path=None,
+                 parse_cache_size=100000, sql_database_path=None, timed=False,
+                 parser_class=DependencyParser):
+    global _worker_qa
+    # every worker polls the same files, so they all pick up schedule changes on their own
+    _worker_qa = QuestionAnswering(database_path=database_path,
+                                   metrics=StageTimings() if timed else None,
+                                   max_rows=max_rows,
+                                   reload_interval=reload_interval, delta_dir=delta_dir,
+                                   tokenizer_backend=tokenizer_backend,
+                                   lexicon_path=lexicon_path,
+                                   parse_cache_path=parse_cache_path,
+                                   parse_cache_size=parse_cache_size,
+                                   sql_database_path=sql_database_path,
+                                   parser_class=parser_class)
+
+
+def _answer_in_worker(question):
+    return _with_timings(_worker_qa.answer(question))
+
+
+def _answer_or_error_in_worker(question):
+    # caught per question, so one failure does not discard the rest of the batch
+    return _with_timings(_worker_qa.answer_or_error(question))
+
+
+def _with_timings(output):
+    # the stage timings of this answer travel back with it, to be replayed in the parent
+    if _worker_qa.metrics is None:
+        return output, None
+    return output, _worker_qa.metrics.drain()
+
+
+def _parse_in_worker(question):
+    return _worker_qa.parse(question)
+
+
+def write_output(output, path):
+    with open(path, 'w') as f:
+        # relation
+        f.write('Relation:\n')
+        for relation in output['relations']:
+            f.write(relation.__str__() + '\n')
+        # grammatical relation
+        f.write('\nGrammatical Relation:\n')
+        for grammatical_relation in output['grammatical_relations']:
+            f.write(grammatical_relation.__str__() + '\n')
+        # logical form
+        f.write('\nLogical Form:\n')
+        for key, logical_form in output['logical_forms'].items():
+            if logical_form:
+                f.write(f"{' '.join(loc.__str__() for loc in logical_form)}\n")
+        # procedural semantic
+        f.write('\nProcedural Semantic:\n')
+        for procedural_semantic in output['procedural_semantics']:
+            f.write(procedural_semantic.__str__() + '\n')
+        # output
+        f.write('\nOutput:\n')
+        f.write(output['output'] + '\n')
 
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='number of worker processes, 0 to use every core')
+    arg_parser.add_argument('--startup-report', action='store_true',
+                            help='print import and time-to-first-answer timings to stderr')
+    arg_parser.add_argument('--serve', action='store_true',
+                            help='keep a warm instance and answer over HTTP/JSON')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8000)
+    arg_parser.add_argument('--threads', type=int, default=1,
+                            help='executor threads used by the server for the NLP pipeline')
+    arg_parser.add_argument('--stream', metavar='QUESTIONS', default=None,
+                            help="answer a question file ('-' for stdin) lazily into one JSONL sink")
+    arg_parser.add_argument('--stream-output', default=os.path.join('output', 'answers.jsonl'),
+                            help="append-only JSONL sink for --stream ('-' for stdout)")
+    arg_parser.add_argument('--batch-size', type=int, default=1024)
+    arg_parser.add_argument('--max-rows', type=int, default=None,
+                            help='cap the number of rows rendered into one answer')
+    arg_parser.add_argument('--structured', action='store_true',
+                            help='--stream writes typed flight records instead of rendered text')
+    arg_parser.add_argument('--reload-interval', type=float, default=None,
+                            help='seconds between checks of database.csv and the delta files')
+    arg_parser.add_argument('--delta-dir', default=None,
+                            help='directory of insert/update/delete delta CSVs to apply')
+    arg_parser.add_argument('--tokenizer', choices=Tokenizer.BACKENDS, default='underthesea',
+                            help='word segmentation backend, trie falls back to underthesea')
+    arg_parser.add_argument('--lexicon', default=None,
+                            help='extra lexemes for the trie tokenizer, one per line')
+    arg_parser.add_argument('--parse-cache', default=None,
+                            help='SQLite file caching the parse of every answered question')
+    arg_parser.add_argument('--parse-cache-size', type=int, default=100000,
+                            help='maximum number of questions kept in --parse-cache')
+    arg_parser.add_argument('--sql-database', default=None,
+                            help='query an indexed SQLite copy of the CSV (built when missing)')
+    arg_parser.add_argument('--metrics', choices=['json', 'prometheus'], default=None,
+                            help='time every answer() stage and dump the histograms to stderr')
+    arg_parser.add_argument('--flush-interval', type=float, default=1.0,
+                            help='seconds between flushes of the JSONL sink')
+    args = arg_parser.parse_args()
+    if args.sql_database and (args.reload_interval is not None or args.delta_dir):
+        arg_parser.error('--sql-database cannot be combined with --reload-interval or '
+                         '--delta-dir')
+
     input_dir = 'input'
     output_dir = 'output'
-    qa = QuestionAnswering(database_path=os.path.join(input_dir, 'database.csv'))
-    queries_file = os.path.join(input_dir, 'queries.txt')
-
-    with open(queries_file, 'r') as f:
-        queries = f.read().splitlines()
-    for idx, query in enumerate(queries):
-        output = qa.answer(query)
-        with open(os.path.join(output_dir, f'output_{idx}.txt'), 'w') as f:
-            # relation
-            f.write('Relation:\n')
-            for relation in output['relations']:
-                f.write(relation.__str__() + '\n')
-            # grammatical relation
-            f.write('\nGrammatical Relation:\n')
-            for grammatical_relation in output['grammatical_relations']:
-                f.write(grammatical_relation.__str__() + '\n')
-            # logical form
-            f.write('\nLogical Form:\n')
-            for key, logical_form in output['logical_forms'].items():
-                if logical_form:
-                    f.write(f"{' '.join(loc.__str__() for loc in logical_form)}\n")
-            # procedural semantic
-            f.write('\nProcedural Semantic:\n')
-            for procedural_semantic in output['procedural_semantics']:
-                f.write(procedural_semantic.__str__() + '\n')
-            # output
-            f.write('\nOutput:\n')
-            f.write(output['output'] + '\n')
+    metrics = StageMetrics() if args.metrics else None
+    qa = QuestionAnswering(database_path=os.path.join(input_dir, 'database.csv'),
+                           metrics=metrics, max_rows=args.max_rows,
+                           reload_interval=args.reload_interval, delta_dir=args.delta_dir,
+                           tokenizer_backend=args.tokenizer, lexicon_path=args.lexicon,
+                           parse_cache_path=args.parse_cache,
+                           parse_cache_size=args.parse_cache_size,
+                           sql_database_path=args.sql_database)
+
+    if args.serve:
+        from modules.server import serve
+
+        qa.warm_up()
+        serve(qa, host=args.host, port=args.port, threads=args.threads)
+    elif args.stream:
+        from modules.pipeline import run_stream
+
+        run_stream(qa, args.stream, args.stream_output, workers=args.workers or None,
+                   batch_size=args.batch_size, flush_interval=args.flush_interval,
+                   structured=args.structured)
+    else:
+        queries_file = os.path.join(input_dir, 'queries.txt')
+        with open(queries_file, 'r') as f:
+            queries = f.read().splitlines()
+        outputs = qa.answer_many(queries, workers=args.workers or None)
+        for idx, output in enumerate(outputs):
+            write_output(output, os.path.join(output_dir, f'output_{idx}.txt'))
+
+    if args.startup_report:
+        print(startup.report(), file=sys.stderr)
+    if metrics is not None:
+        print(metrics.to_json() if args.metrics == 'json' else metrics.to_prometheus(),
+              file=sys.stderr)
@@ -0,0 +1,114 @@
+from collections.abc import Mapping
+
+from . import startup
+
+_UNSET = object()
+
+
+class QueryResult(object):
+    def __init__(self, plan, rows, render):
+        self.plan = plan
+        self.rows = rows
+        self.row_count = len(rows)
+        # render(rows, projection, limit, offset) -> prose answer, only called on demand
+        self._render = render
+        # only the last rendered page is kept, so paging a long-lived result stays bounded
+        self._text = None
+
+    @property
+    def kind(self):
+        return 'yes_no' if self.plan.projection[0].startswith('PRINT-YES-NO') else 'list'
+
+    def text(self, limit=None, offset=0):
+        key = (limit, offset)
+        last = self._text
+        if last is not None and last[0] == key:
+            return last[1]
+        text = self._render(self.rows, self.plan.projection, limit, offset)
+        self._text = (key, text)
+        return text
+
+    def records(self, limit=None, offset=0):
+        rows = self.rows.page(offset, limit) if limit is not None or offset else self.rows
+        return rows.records()
+
+    def detach(self, limit=None, offset=0):
+        # a copy holding only the records of one page, which pickles without the store
+        database = startup.lazy_import('modules.database')
+        rows = database.PageRows(self.records(limit, offset), offset, self.row_count)
+        return QueryResult(self.plan, rows, self._render)
+
+
+class Answer(Mapping):
+    KEYS = ('relations', 'grammatical_relations', 'logical_forms', 'procedural_semantics',
+            'output', 'row_count')
+
+    def __init__(self, relations, grammatical_relations, logical_forms, procedural_semantics,
+                 result, limit=None, offset=0):
+        self.relations = relations
+        self.grammatical_relations = grammatical_relations
+        self.logical_forms = logical_forms
+        self.procedural_semantics = procedural_semantics
+        self.result = result
+        self.limit = limit
+        self.offset = offset
+        self.kind = result.kind
+        self.row_count = result.row_count
+        self._output = _UNSET
+        self._records = None
+
+    @property
+    def output(self):
+        # the prose answer is only rendered when someone reads it
+        if self._output is _UNSET:
+            self._output = self.result.text(self.limit, self.offset)
+        return self._output
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = self.result.records(self.limit, self.offset)
+        return self._records
+
+    def structured(self):
+        structured = {'kind': self.kind, 'row_count': self.row_count}
+        if self.kind == 'yes_no':
+            structured['answer'] = self.row_count > 0
+        structured['records'] = [record._asdict() for record in self.records]
+        return structured
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __getstate__(self):
+        # the rows point into the (memory-mapped) store: keep only the requested page, the
+        # prose and records are rendered from it on the other side when they are read
+        state = self.__dict__.copy()
+        state['result'] = self.result.detach(self.limit, self.offset)
+        if state['_output'] is _UNSET:
+            # the sentinel does not survive pickling, __setstate__ restores it
+            del state['_output']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_output', _UNSET)
+
+
+class AnswerError(object):
+    # stands in for the answer to a question that failed, so one bad line does not stop a
+    # stream; it only holds strings, so it always pickles back from a worker process
+    def __init__(self, question, error):
+        self.question = question
+        self.error = '{}: {}'.format(type(error).__name__, error)
+
+    def __repr__(self):
+        return 'AnswerError({!r}, {!r})'.format(self.question, self.error)
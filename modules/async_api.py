@@ -0,0 +1,114 @@
+import asyncio
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .answer import Answer, QueryResult
+from .sql_store import SQLFlightStore
+
+
+class MemoryBackend(object):
+    # the in-process flight store; a lookup may load the store, map the snapshot or apply a
+    # reload, so it runs on executor (None is the loop's default threads), never on the loop
+    def __init__(self, qa, executor=None):
+        self.qa = qa
+        self.executor = executor
+
+    async def query(self, plan, limit=None, offset=0):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.qa.query_plan, plan)
+
+
+class SQLiteBackend(object):
+    # SQLFlightStore queries block, so they run on threads, one per pooled connection
+    def __init__(self, store, render, executor=None):
+        self.store = store
+        self.render = render
+        self.executor = executor or ThreadPoolExecutor(max_workers=store.pool.size)
+
+    @classmethod
+    def from_store(cls, flight_store, render, path=':memory:', pool_size=4):
+        return cls(SQLFlightStore.from_store(flight_store, path, pool_size), render)
+
+    def _select(self, plan, limit=None, offset=0):
+        rows = plan.execute(self.store)
+        # count and fetch the requested page here, off the event loop, so rendering the
+        # answer later never waits on SQLite
+        len(rows)
+        page = rows.page(offset, limit) if limit is not None or offset else rows
+        page.rows
+        return QueryResult(plan, rows, self.render)
+
+    async def query(self, plan, limit=None, offset=0):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._select, plan, limit, offset)
+
+    def close(self):
+        self.executor.shutdown()
+        self.store.close()
+
+
+class AsyncQuestionAnswering(object):
+    def __init__(self, qa, parse, executor=None, backend=None, max_concurrency=64):
+        self.qa = qa
+        # parse(question) -> artefacts, run on executor (None is the loop's default threads)
+        self.parse = parse
+        self.executor = executor
+        self.backend = backend or MemoryBackend(qa)
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._warm = False
+        self._warming = None
+
+    @property
+    def semaphore(self):
+        # created on first use, inside the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def warm_up(self):
+        # the first questions would otherwise load the store and import the segmenter on
+        # several executor threads at once; every caller waits for this single warm-up
+        if self._warm:
+            return
+        loop = asyncio.get_running_loop()
+        if self._warming is None or self._warming[0] is not loop:
+            front_end = not isinstance(self.executor, ProcessPoolExecutor)
+            self._warming = (loop, loop.run_in_executor(None, self.qa.warm_up, front_end))
+        await self._warming[1]
+        self._warm = True
+
+    async def answer(self, question, limit=None, offset=0):
+        await self.warm_up()
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            artefacts = await loop.run_in_executor(self.executor, self.parse, question)
+            plan = self.qa.planner.compile(artefacts[3])
+            if limit is None:
+                limit = self.qa.max_rows
+            result = await self.backend.query(plan, limit, offset)
+        return Answer(*artefacts, result, limit, offset)
+
+    async def answer_stream(self, questions, limit=None, offset=0):
+        # questions may be a plain or an async iterable; answers keep the input order and
+        # at most max_concurrency questions are in flight
+        pending = collections.deque()
+        try:
+            async for question in _iterate(questions):
+                pending.append(asyncio.ensure_future(self.answer(question, limit, offset)))
+                if len(pending) >= self.max_concurrency:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+async def _iterate(questions):
+    if hasattr(questions, '__aiter__'):
+        async for question in questions:
+            yield question
+    else:
+        for question in questions:
+            yield question
@@ -0,0 +1,306 @@
+import csv
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from .schema import AIRLINES, COLUMNS, STRING_COLUMNS, TIME_COLUMNS, format_time, parse_time
+
+
+# one typed row: codes and places as str, times as int minutes (see schema.parse_time)
+FlightRecord = namedtuple('FlightRecord', [column.lower() for column in COLUMNS])
+
+
+def source_fingerprint(path):
+    # exact size and mtime of a source CSV; a copy that keeps an older mtime still differs
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def code_dtype(size):
+    if size <= np.iinfo(np.uint8).max:
+        return np.uint8
+    if size <= np.iinfo(np.uint16).max:
+        return np.uint16
+    return np.uint32
+
+
+def format_times(minutes):
+    # format each distinct value once and gather, instead of one format() per row
+    values, inverse = np.unique(minutes, return_inverse=True)
+    formatted = np.array([format_time(value) for value in values.tolist()], dtype=object)
+    return formatted[inverse].tolist()
+
+
+class Vocabulary(object):
+    def __init__(self, values):
+        # values are kept sorted so that codes compare like the strings they encode
+        self.values = values
+        self._codes = {value: code for code, value in enumerate(values)}
+        self._array = np.array(values, dtype=object)
+
+    def encode(self, value):
+        return self._codes.get(value)
+
+    def decode(self, codes):
+        return self._array[codes].tolist()
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class FlightIndex(object):
+    AIRLINES = AIRLINES
+    AIRLINE_PATTERN = re.compile(r"^[a-z]+", re.IGNORECASE)
+
+    def __init__(self, size, columns, airlines):
+        self.size = size
+        # column -> (sorted distinct keys, group starts, row ids ordered by key)
+        self.columns = columns
+        self.airlines = airlines
+
+    @classmethod
+    def build(cls, store):
+        columns = {}
+        for column in COLUMNS:
+            # group row ids by code: one argsort instead of a python loop per row
+            values = store.columns[column]
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            keys, starts = np.unique(values[order], return_index=True)
+            starts = np.append(starts, len(order)).astype(np.int64)
+            columns[column] = (keys, starts, order)
+        airline_codes = {}
+        for code, flight in enumerate(store.vocabularies['FLIGHT']):
+            match = cls.AIRLINE_PATTERN.match(flight)
+            if match:
+                airline_codes.setdefault(match.group().upper(), []).append(code)
+        flights = store.columns['FLIGHT']
+        airlines = {airline: np.flatnonzero(np.isin(flights, codes)).astype(np.int32)
+                    for airline, codes in airline_codes.items()}
+        return cls(len(store), columns, airlines)
+
+    def group(self, column, value):
+        keys, starts, order = self.columns[column]
+        try:
+            # search with the keys' own dtype, otherwise numpy upcasts the whole array
+            value = keys.dtype.type(value)
+        except OverflowError:
+            return np.empty(0, dtype=np.int32)
+        pos = np.searchsorted(keys, value)
+        if pos == len(keys) or keys[pos] != value:
+            return np.empty(0, dtype=np.int32)
+        return order[starts[pos]:starts[pos + 1]]
+
+    def lookup(self, predicates, airline=None):
+        candidates = [self.group(column, value) for column, value in predicates.items()]
+        if airline:
+            candidates.append(self.airlines.get(airline, np.empty(0, dtype=np.int32)))
+        if not candidates:
+            return np.arange(self.size, dtype=np.int32)
+        # start from the most selective predicate so the working set stays small
+        candidates.sort(key=len)
+        rows = candidates[0]
+        for candidate in candidates[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, candidate, assume_unique=True)
+        return rows
+
+
+class FlightRows(object):
+    def __init__(self, store, rows):
+        self.store = store
+        self.rows = rows
+
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, column):
+        return self.store.values(column, self.rows)
+
+    def formatted(self, column):
+        if column in TIME_COLUMNS:
+            return format_times(self.store.columns[column][self.rows])
+        return self[column]
+
+    def page(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        return FlightRows(self.store, self.rows[offset:end])
+
+    def records(self):
+        return list(map(FlightRecord._make, zip(*(self[column] for column in COLUMNS))))
+
+
+class RecordRows(object):
+    # FlightRows over already decoded FlightRecords, for backends that are not a FlightStore
+    def __init__(self, records):
+        self.rows = records
+
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, column):
+        return [getattr(record, column.lower()) for record in self.rows]
+
+    def formatted(self, column):
+        if column in TIME_COLUMNS:
+            return [format_time(value) for value in self[column]]
+        return self[column]
+
+    def page(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        return RecordRows(self.rows[offset:end])
+
+    def records(self):
+        return list(self.rows)
+
+
+class PageRows(RecordRows):
+    # the one page an answer asked for, detached from the store; len() is still the total
+    def __init__(self, records, offset, total):
+        super(PageRows, self).__init__(records)
+        self.offset = offset
+        self.total = total
+
+    @property
+    def empty(self):
+        return self.total == 0
+
+    def __len__(self):
+        return self.total
+
+    def page(self, offset=0, limit=None):
+        start = max(offset - self.offset, 0)
+        end = None if limit is None else start + limit
+        return RecordRows(self.rows[start:end])
+
+
+class FlightStore(object):
+    def __init__(self, columns, vocabularies, index=None):
+        self.columns = columns
+        self.vocabularies = vocabularies
+        self.index = index or FlightIndex.build(self)
+
+    @classmethod
+    def from_records(cls, records):
+        vocabularies = {column: {} for column in STRING_COLUMNS}
+        values = {column: [] for column in COLUMNS}
+        for record in records:
+            for column in STRING_COLUMNS:
+                vocabulary = vocabularies[column]
+                values[column].append(vocabulary.setdefault(record[column], len(vocabulary)))
+            for column in TIME_COLUMNS:
+                minutes = parse_time(record[column])
+                if minutes is None:
+                    raise ValueError('invalid {} value: {!r}'.format(column, record[column]))
+                values[column].append(minutes)
+        columns = {}
+        sorted_vocabularies = {}
+        for column in STRING_COLUMNS:
+            vocabulary = sorted(vocabularies[column])
+            # renumber the first-seen codes into sorted order
+            remap = np.empty(len(vocabulary), dtype=code_dtype(len(vocabulary)))
+            for code, value in enumerate(vocabulary):
+                remap[vocabularies[column][value]] = code
+            columns[column] = remap[np.array(values[column], dtype=np.int64)]
+            sorted_vocabularies[column] = Vocabulary(vocabulary)
+        for column in TIME_COLUMNS:
+            columns[column] = np.array(values[column], dtype=np.int16)
+        return cls(columns, sorted_vocabularies)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return cls.from_records(read_records(f, path))
+
+    def __len__(self):
+        return len(self.columns['FLIGHT'])
+
+    def encode(self, column, value):
+        if column in self.vocabularies:
+            return self.vocabularies[column].encode(value)
+        return value
+
+    def values(self, column, rows=None):
+        data = self.columns[column] if rows is None else self.columns[column][rows]
+        if column in self.vocabularies:
+            return self.vocabularies[column].decode(data)
+        return data.tolist()
+
+    def mask(self, column, value):
+        code = self.encode(column, value)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.columns[column] == code
+
+    def apply_delta(self, upserts=(), deletes=()):
+        # build the updated table next to this one; queries still holding self are not disturbed
+        upserts = list(upserts)
+        keep = np.ones(len(self), dtype=bool)
+        for flight in set(deletes).union(record['FLIGHT'] for record in upserts):
+            code = self.encode('FLIGHT', flight)
+            if code is not None:
+                keep[self.index.group('FLIGHT', code)] = False
+        added = FlightStore.from_records(upserts) if upserts else None
+
+        columns = {}
+        vocabularies = {}
+        for column in STRING_COLUMNS:
+            # keep only the values still referenced, merged with the inserted ones in sorted order
+            kept = self.columns[column][keep]
+            used = np.unique(kept)
+            old_values = self.vocabularies[column].decode(used)
+            new_values = list(added.vocabularies[column]) if added else []
+            vocabulary = sorted(set(old_values).union(new_values))
+            codes = {value: code for code, value in enumerate(vocabulary)}
+            dtype = code_dtype(len(vocabulary))
+            remap = np.zeros(len(self.vocabularies[column]), dtype=dtype)
+            remap[used] = [codes[value] for value in old_values]
+            parts = [remap[kept]]
+            if added:
+                parts.append(np.array([codes[value] for value in new_values],
+                                      dtype=dtype)[added.columns[column]])
+            columns[column] = np.concatenate(parts)
+            vocabularies[column] = Vocabulary(vocabulary)
+        for column in TIME_COLUMNS:
+            parts = [self.columns[column][keep]]
+            if added:
+                parts.append(added.columns[column])
+            columns[column] = np.concatenate(parts).astype(np.int16)
+        return FlightStore(columns, vocabularies)
+
+    def select(self, predicates, airline=None):
+        encoded = {}
+        for column, value in predicates:
+            code = self.encode(column, value)
+            if code is None:
+                return FlightRows(self, np.empty(0, dtype=np.int32))
+            encoded[column] = code
+        return FlightRows(self, self.index.lookup(encoded, airline))
+
+
+def read_records(f, path):
+    # the rows of a flight CSV as dicts; every column must be in the header and every row
+    # complete, since a half-written CSV ends in a short row that would otherwise reach
+    # parse_time as None
+    reader = csv.DictReader(f)
+    missing = [column for column in COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError('{}: missing {} columns'.format(path, ', '.join(missing)))
+    for row in reader:
+        if None in row or None in row.values():
+            raise ValueError('{}:{}: expected {} fields'.format(path, reader.line_num,
+                                                                len(reader.fieldnames)))
+        yield row
@@ -0,0 +1,104 @@
+import bisect
+import json
+import threading
+
+# log-spaced upper bounds in seconds, 1us .. ~16s
+DEFAULT_BUCKETS = [1e-6 * 2 ** i for i in range(25)]
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                # interpolate linearly inside the bucket that holds the rank
+                low = self.buckets[idx - 1] if idx > 0 else 0.0
+                high = self.buckets[idx] if idx < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+
+class StageMetrics(object):
+    STAGES = ['tokenize', 'parse', 'construct_grammar', 'construct_logical_form',
+              'construct_procedural_semantic', 'query_database', 'total']
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {stage: Histogram(self.buckets) for stage in self.STAGES}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def replay(self, observations):
+        # (stage, seconds) pairs recorded elsewhere, e.g. by a worker's StageTimings
+        for stage, seconds in observations:
+            self.observe(stage, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, name='qa_stage_duration_seconds'):
+        lines = ['# HELP {} Wall time spent in each answer() stage.'.format(name),
+                 '# TYPE {} histogram'.format(name)]
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + [float('inf')], histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(
+                        name, stage, le, cumulative))
+                lines.append('{}_sum{{stage="{}"}} {}'.format(name, stage, histogram.sum))
+                lines.append('{}_count{{stage="{}"}} {}'.format(name, stage, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimings(object):
+    # what a worker process records instead of StageMetrics: the raw observations, drained
+    # after every answer and replayed into the parent's StageMetrics
+    def __init__(self):
+        self._observations = []
+
+    def observe(self, stage, seconds):
+        self._observations.append((stage, seconds))
+
+    def drain(self):
+        observations, self._observations = self._observations, []
+        return observations
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# bump when the pickled artefacts change shape
+FORMAT_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS parses (
+    rules TEXT NOT NULL,
+    question TEXT NOT NULL,
+    artefacts BLOB NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (rules, question)
+);
+CREATE INDEX IF NOT EXISTS parses_used ON parses (used);
+'''
+
+
+def rules_key(*fingerprints):
+    return hashlib.sha256(repr((FORMAT_VERSION,) + fingerprints).encode('utf-8')).hexdigest()
+
+
+class ParseCache(object):
+    # a hit refreshes its timestamp at most this often, so reads rarely need the write lock
+    TOUCH_INTERVAL = 3600.0
+
+    def __init__(self, path, rules, maxsize=100000, timeout=30.0):
+        self.path = path
+        # entries written under other rule tables are never read and age out
+        self.rules = rules
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.evict_every = max(1, maxsize // 10)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._connection()
+
+    def _connection(self):
+        # one connection per thread and per process; sqlite connections must not cross a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            # WAL lets readers in every worker process run while one of them writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, question):
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT artefacts, used FROM parses '
+                                     'WHERE rules = ? AND question = ?',
+                                     (self.rules, question)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] > self.TOUCH_INTERVAL:
+                connection.execute('UPDATE parses SET used = ? WHERE rules = ? AND question = ?',
+                                   (now, self.rules, question))
+            artefacts = pickle.loads(row[0])
+        except (sqlite3.Error, pickle.UnpicklingError, AttributeError, EOFError):
+            # the cache is only an accelerator: any failure is a miss
+            self.errors += 1
+            return None
+        self.hits += 1
+        return artefacts
+
+    def put(self, question, artefacts):
+        if self.maxsize <= 0:
+            return
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO parses (rules, question, artefacts, used) '
+                'VALUES (?, ?, ?, ?)',
+                (self.rules, question, pickle.dumps(artefacts, pickle.HIGHEST_PROTOCOL),
+                 time.time()))
+        except sqlite3.Error:
+            self.errors += 1
+            return
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        # drop the least recently used entries beyond maxsize
+        try:
+            self._connection().execute(
+                'DELETE FROM parses WHERE rowid IN (SELECT rowid FROM parses ORDER BY used '
+                'LIMIT max(0, (SELECT COUNT(*) FROM parses) - ?))', (self.maxsize,))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def clear(self):
+        self._connection().execute('DELETE FROM parses')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM parses').fetchone()[0]
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors
+        }
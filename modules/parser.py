@@ -1,3 +1,4 @@
+import hashlib
 import re
 
 from .relations import *
@@ -5,6 +6,8 @@ from .semantics import *
 
 
 class Relation(object):
+    __slots__ = ('relation_type', 'l', 'r', 'action')
+
     def __init__(self, relation_type, l, r, action):
         self.relation_type = relation_type
         self.l = l
@@ -65,7 +68,7 @@ class DependencyParser(object):
     ]
 
     TIMES_PATTERNS = re.compile(r"^([0-9]|1[0-9]|2[0-3]):[0-5][0-9]hr$")
-    TIME_DURATION_PATTERNS = re.compile(r"[0-9]_giờ$")
+    TIME_DURATION_PATTERNS = re.compile(r"[0-9]+_giờ$")
     AIRLINE_PATTERNS = re.compile(r"v[a-z][1-9]")
 
     MAPPER = {
@@ -75,155 +78,255 @@ class DependencyParser(object):
         'thành_phố': 'DEST'
     }
 
+    # lexeme lists in the order _pos_tagging gives them priority
+    TAG_ORDER = ['VERBS', 'NOUNS', 'NAMES', 'WH_WORDS', 'FROM', 'AT', 'QUERY', 'IN']
+    # every tag a token can get (ROOTS is the stack bottom); relation rules may only use these
+    TAGS = ['ROOTS'] + TAG_ORDER + ['TO', 'TIMES_PATTERNS', 'TIME_DURATION_PATTERNS',
+                                    'AIRLINE_PATTERNS', 'OTHER']
+
+    @classmethod
+    def lexicon(cls):
+        # lexeme -> tag, built once per class so tagging cost does not grow with the vocabulary
+        lexicon = cls.__dict__.get('_lexicon')
+        if lexicon is None:
+            lexicon = {}
+            for tag in reversed(cls.TAG_ORDER):
+                for lexeme in getattr(cls, tag):
+                    lexicon[lexeme] = tag
+            cls._lexicon = lexicon
+            cls._names = frozenset(cls.NAMES)
+            cls._to_words = frozenset(cls.TO)
+        return lexicon
+
+    @classmethod
+    def load_gazetteer(cls, path):
+        # one entry per line: "lexeme<TAB>TAG[<TAB>CODE]", e.g. "đà lạt\tNAMES\tĐL"; NAMES need
+        # the CODE, construct_procedural_semantic looks every name up in NAMES_MAPPER
+        lists = {tag: list(getattr(cls, tag)) for tag in cls.TAG_ORDER}
+        names_mapper = dict(cls.NAMES_MAPPER)
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = line.split('\t')
+                lexeme = '_'.join(fields[0].lower().split())
+                tag = fields[1] if len(fields) > 1 else 'NAMES'
+                if tag not in lists:
+                    raise ValueError('{}:{}: unknown tag {!r}'.format(path, line_number, tag))
+                if tag == 'NAMES' and (len(fields) < 3 or not fields[2]):
+                    raise ValueError('{}:{}: NAMES entry {!r} needs a CODE'.format(
+                        path, line_number, fields[0]))
+                if lexeme not in lists[tag]:
+                    lists[tag].append(lexeme)
+                if len(fields) > 2:
+                    names_mapper[lexeme] = fields[2]
+        for tag, lexemes in lists.items():
+            setattr(cls, tag, lexemes)
+        cls.NAMES_MAPPER = names_mapper
+        cls._lexicon = None
+
+    @classmethod
+    def rules_fingerprint(cls):
+        # changes whenever a vocabulary, a mapper or a relation rule changes
+        rules = (sorted(cls.lexicon().items()), sorted(cls.NAMES_MAPPER.items()),
+                 sorted(cls.MAPPER.items()), cls.RELATION_RULES,
+                 [pattern.pattern for pattern in (cls.TIMES_PATTERNS,
+                                                  cls.TIME_DURATION_PATTERNS,
+                                                  cls.AIRLINE_PATTERNS)])
+        return hashlib.sha256(repr(rules).encode('utf-8')).hexdigest()
+
+    def _is_name(self, token):
+        self.lexicon()
+        return token.lower() in self._names
+
     def _pos_tagging(self, tokens):
+        lexicon = self.lexicon()
         tags = []
-        for idx, token in enumerate(tokens):
+        seen_from = False
+        for token in tokens:
             token_lower = token.lower()
-            if token_lower in self.VERBS:
-                if token_lower in self.TO:
-                    if 'FROM' in tags or tags[-1] == 'VERBS':
-                        tags.append('TO')
-                    else:
-                        tags.append('VERBS')
+            tag = lexicon.get(token_lower)
+            if tag == 'VERBS' and token_lower in self._to_words:
+                if seen_from or (tags and tags[-1] == 'VERBS'):
+                    tag = 'TO'
+            elif tag is None:
+                if self.TIMES_PATTERNS.match(token_lower):
+                    tag = 'TIMES_PATTERNS'
+                elif self.TIME_DURATION_PATTERNS.match(token_lower):
+                    tag = 'TIME_DURATION_PATTERNS'
+                elif self.AIRLINE_PATTERNS.match(token_lower):
+                    tag = 'AIRLINE_PATTERNS'
                 else:
-                    tags.append('VERBS')
-            elif token_lower in self.NOUNS:
-                tags.append('NOUNS')
-            elif token_lower in self.NAMES:
-                tags.append('NAMES')
-            elif token_lower in self.WH_WORDS:
-                tags.append('WH_WORDS')
-            elif token_lower in self.FROM:
-                tags.append('FROM')
-            elif token_lower in self.AT:
-                tags.append('AT')
-            elif token_lower in self.QUERY:
-                tags.append('QUERY')
-            elif token_lower in self.IN:
-                tags.append('IN')
-            elif self.TIMES_PATTERNS.match(token_lower):
-                tags.append('TIMES_PATTERNS')
-            elif self.TIME_DURATION_PATTERNS.match(token_lower):
-                tags.append('TIME_DURATION_PATTERNS')
-            elif self.AIRLINE_PATTERNS.match(token_lower):
-                tags.append('AIRLINE_PATTERNS')
-            else:
-                tags.append('OTHER')
+                    tag = 'OTHER'
+            elif tag == 'FROM':
+                seen_from = True
+            tags.append(tag)
         return tags
 
     def parse(self, tokens):
         tags = self._pos_tagging(tokens)
-        stack = [('<ROOT>', 'ROOTS')]
-        buffer = list(zip(tokens, tags))
+        # the stack holds token positions (-1 is <ROOT>) and the buffer is everything
+        # from `head` on, so no (token, tag) tuples are built or popped from a list front
+        stack = [-1, 0]
+        head = 1
         relations = []
-        stack.append(buffer.pop(0))
-        while buffer:
-            top_stack = stack[-1]
-            head_buffer = buffer[0]
+        while head < len(tokens):
+            top = stack[-1]
+            if top < 0:
+                top_text, top_tag = '<ROOT>', 'ROOTS'
+            else:
+                top_text, top_tag = tokens[top], tags[top]
+            head_tag = tags[head]
 
-            relation = self.check_relation(top_stack, head_buffer)
+            relation = self._relation(top_text, top_tag, tokens[head], head_tag)
             if relation:
                 relations.append(relation)
                 if relation.relation_type == 'nmod':
-                    stack.append(buffer.pop(0))
-                    stack.pop()
+                    # SHIFT immediately followed by REDUCE
+                    head += 1
                     continue
                 if relation.action == 'RA':
-                    stack.append(buffer.pop(0))
+                    stack.append(head)
+                    head += 1
                 elif relation.action == 'LA':
                     stack.pop()
             else:
                 # SHIFT and REDUCE case
-                if (top_stack[1] not in ['NOUNS', 'VERBS'] and head_buffer[1] == 'VERBS') or \
-                        (top_stack[1] in ['NOUNS', 'NAMES'] and head_buffer[1] != 'VERBS') or \
-                        (top_stack[1] not in ['VERBS', 'ROOTS']):
+                if (top_tag not in ['NOUNS', 'VERBS'] and head_tag == 'VERBS') or \
+                        (top_tag in ['NOUNS', 'NAMES'] and head_tag != 'VERBS') or \
+                        (top_tag not in ['VERBS', 'ROOTS']):
                     stack.pop()
                 else:
-                    stack.append(buffer.pop(0))
+                    stack.append(head)
+                    head += 1
         return relations
 
+    @staticmethod
+    def _swaps(tag_a, rel_type):
+        # the head is on the right for these rules, so the arguments are stored swapped
+        return rel_type == 'nsubj' or tag_a in ['TO', 'FROM', 'IN'] or \
+            (rel_type == 'WH_det' and tag_a == 'WH_WORDS')
+
+    @classmethod
+    def relation_table(cls):
+        # (tag_a, tag_b) -> (rel_type, action, swap); the first rule for a pair wins
+        table = cls.__dict__.get('_relation_table')
+        if table is None:
+            table = {}
+            for (a_cond, b_cond), rel_type, action in cls.RELATION_RULES:
+                table.setdefault((a_cond, b_cond),
+                                 (rel_type, action, cls._swaps(a_cond, rel_type)))
+            cls._relation_table = table
+        return table
+
+    @classmethod
+    def load_relation_rules(cls, path):
+        # one rule per line: "TAG_A<TAB>TAG_B<TAB>rel_type<TAB>LA|RA"; a pair that already has
+        # a different rule is an error, since relation_table() would silently keep the first
+        rules = list(cls.RELATION_RULES)
+        known = {pair: (rel_type, action) for pair, rel_type, action in reversed(rules)}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = line.split('\t')
+                if len(fields) != 4 or fields[3] not in ['LA', 'RA']:
+                    raise ValueError('{}:{}: invalid relation rule {!r}'.format(
+                        path, line_number, line))
+                for tag in fields[:2]:
+                    if tag not in cls.TAGS:
+                        raise ValueError('{}:{}: unknown tag {!r}'.format(path, line_number, tag))
+                pair = (fields[0], fields[1])
+                rule = (fields[2], fields[3])
+                if known.setdefault(pair, rule) != rule:
+                    raise ValueError('{}:{}: {} {} already has the rule {} {}'.format(
+                        path, line_number, pair[0], pair[1], *known[pair]))
+                rules.append((pair, fields[2], fields[3]))
+        cls.RELATION_RULES = rules
+        cls._relation_table = None
+
     def check_relation(self, token_a, token_b):
-        token_text_a, token_type_a = token_a
-        token_text_b, token_type_b = token_b
+        return self._relation(token_a[0], token_a[1], token_b[0], token_b[1])
 
+    def _relation(self, token_text_a, token_type_a, token_text_b, token_type_b):
         if token_type_a == 'VERBS' and token_text_a == 'đến':
             return Relation('to_loc', token_text_a, token_text_b, 'LA')
 
-        for (a_cond, b_cond), rel_type, action in self.RELATION_RULES:
-            a_match = token_type_a == a_cond
-            b_match = token_type_b == b_cond
-
-            if a_match and b_match:
-                if rel_type == 'nsubj' or token_type_a in ['TO', 'FROM', 'IN'] or \
-                        (rel_type == 'WH_det' and token_type_a == 'WH_WORDS'):
-                    return Relation(rel_type, token_text_b, token_text_a, action)
-                else:
-                    return Relation(rel_type, token_text_a, token_text_b, action)
+        rule = self.relation_table().get((token_type_a, token_type_b))
+        if rule is None:
+            # REDUCE and SHIFT case
+            return None
+        rel_type, action, swap = rule
+        if swap:
+            return Relation(rel_type, token_text_b, token_text_a, action)
+        return Relation(rel_type, token_text_a, token_text_b, action)
 
-        # REDUCE and SHIFT case
+    @staticmethod
+    def _grammar_key(grammar):
+        if grammar.type == 'TO_LOC' and isinstance(grammar.token, NOUN):
+            return 'to_loc_noun'
+        elif grammar.type == 'FROM_LOC' and isinstance(grammar.token, NOUN):
+            return 'from_loc_noun'
+        elif grammar.type == 'NAME':
+            return 'name'
+        elif grammar.type == 'NAME_LOC':
+            return 'name_loc'
+        elif grammar.type == 'FROM_LOC':
+            return 'from_loc'
+        elif grammar.type == 'IN_LOC':
+            return 'in_loc'
+        elif grammar.type == 'TO_LOC' and isinstance(grammar.token, NAME):
+            return 'to_loc_name'
+        elif grammar.type == 'FLIGHT' and isinstance(grammar.token, NOUN):
+            return 'flight_noun'
         return None
 
     def postprocess_grammar(self, grammars):
-        to_loc_noun_idx = name_idx = to_loc_name_idx = name_loc_idx = from_loc_idx = in_loc_idx = from_loc_noun_idx = flight_noun_idx = -1
+        # Merge NOUN/NAME pairs and resolve NAME_LOC until nothing changes. Every rule
+        # consumes the most recent grammar of its kind, so one stack of positions per
+        # kind replaces rescanning the whole list after each merge.
+        grammars = list(grammars)
+        positions = {key: [] for key in ['to_loc_noun', 'from_loc_noun', 'name', 'name_loc',
+                                         'from_loc', 'in_loc', 'to_loc_name', 'flight_noun']}
         for idx, grammar in enumerate(grammars):
-            if grammar.type == 'TO_LOC' and isinstance(grammar.token, NOUN):
-                to_loc_noun_idx = idx
-            elif grammar.type == 'FROM_LOC' and isinstance(grammar.token, NOUN):
-                from_loc_noun_idx = idx
-            elif grammar.type == 'NAME':
-                name_idx = idx
-            elif grammar.type == 'NAME_LOC':
-                name_loc_idx = idx
-            elif grammar.type == 'FROM_LOC':
-                from_loc_idx = idx
-            elif grammar.type == 'IN_LOC':
-                in_loc_idx = idx
-            elif grammar.type == 'TO_LOC' and isinstance(grammar.token, NAME):
-                to_loc_name_idx = idx
-            elif grammar.type == 'FLIGHT' and isinstance(grammar.token, NOUN):
-                flight_noun_idx = idx
-
-        if flight_noun_idx != -1 and name_idx != -1:
-            grammars.append(GrammaticalRelation('FLIGHT', NAME(grammars[name_idx].org_token)))
-            grammars[flight_noun_idx] = None
-            grammars[name_idx] = None
-            grammars = [grammar for grammar in grammars if grammar is not None]
-            return grammars
-
-        if from_loc_noun_idx != -1 and name_idx != -1:
-            grammars.append(GrammaticalRelation('FROM_LOC', NAME(grammars[name_idx].org_token)))
-            grammars[from_loc_noun_idx] = None
-            grammars[name_idx] = None
-            grammars = [grammar for grammar in grammars if grammar is not None]
-            return grammars
-
-        if to_loc_noun_idx != -1 and name_idx != -1:
-            grammars.append(GrammaticalRelation('TO_LOC', NAME(grammars[name_idx].org_token)))
-            grammars[to_loc_noun_idx] = None
-            grammars[name_idx] = None
-            grammars = [grammar for grammar in grammars if grammar is not None]
-            return grammars
-
-        if name_loc_idx != -1:
-            if from_loc_idx != -1:
-                grammars.append(
-                    GrammaticalRelation('SOURCE', NAME(grammars[from_loc_idx].token.org_token)))
-                grammars[from_loc_idx] = None
-
-            if to_loc_name_idx != -1:
-                grammars.append(
-                    GrammaticalRelation('DEST', NAME(grammars[to_loc_name_idx].token.org_token)))
-                grammars[to_loc_name_idx] = None
-
-            if in_loc_idx != -1:
-                grammars.append(
-                    GrammaticalRelation('DEST', NAME(grammars[in_loc_idx].token.org_token)))
-                grammars[in_loc_idx] = None
-
-            grammars[name_loc_idx] = None
-
-        grammars = [grammar for grammar in grammars if grammar is not None]
-        return grammars
+            key = self._grammar_key(grammar)
+            if key is not None:
+                positions[key].append(idx)
+
+        def take(key):
+            idx = positions[key].pop()
+            grammar = grammars[idx]
+            grammars[idx] = None
+            return grammar
+
+        def add(grammar, key=None):
+            if key is not None:
+                positions[key].append(len(grammars))
+            grammars.append(grammar)
+
+        while True:
+            if positions['flight_noun'] and positions['name']:
+                take('flight_noun')
+                add(GrammaticalRelation('FLIGHT', NAME(take('name').org_token)))
+            elif positions['from_loc_noun'] and positions['name']:
+                take('from_loc_noun')
+                add(GrammaticalRelation('FROM_LOC', NAME(take('name').org_token)), 'from_loc')
+            elif positions['to_loc_noun'] and positions['name']:
+                take('to_loc_noun')
+                add(GrammaticalRelation('TO_LOC', NAME(take('name').org_token)), 'to_loc_name')
+            elif positions['name_loc']:
+                if positions['from_loc']:
+                    add(GrammaticalRelation('SOURCE', NAME(take('from_loc').token.org_token)))
+                if positions['to_loc_name']:
+                    add(GrammaticalRelation('DEST', NAME(take('to_loc_name').token.org_token)))
+                if positions['in_loc']:
+                    add(GrammaticalRelation('DEST', NAME(take('in_loc').token.org_token)))
+                take('name_loc')
+            else:
+                break
+        return [grammar for grammar in grammars if grammar is not None]
 
     @staticmethod
     def yes_no_case(grammars):
@@ -234,6 +337,7 @@ class DependencyParser(object):
 
     def construct_grammar(self, relations):
         grammars = []
+        has_wh_time = False
         for relation in relations:
             if relation.relation_type == 'WH_det':
                 type = 'WH_{} ?'.format(self.MAPPER[relation.l.lower()])
@@ -249,25 +353,25 @@ class DependencyParser(object):
             elif relation.relation_type == 'nmod':
                 type = self.MAPPER[relation.l.lower()]
                 grammars.append(GrammaticalRelation(type, NAME(
-                    relation.r) if relation.r.lower() in self.NAMES or self.AIRLINE_PATTERNS.match(
+                    relation.r) if self._is_name(relation.r) or self.AIRLINE_PATTERNS.match(
                     relation.r.lower()) else NOUN(relation.r)))
             elif relation.relation_type == 'name_loc':
                 grammars.append(GrammaticalRelation('NAME_LOC', NAME(relation.r)))
             elif relation.relation_type == 'to_loc':
                 if relation.r.lower() == 'đến':
-                    if relation.l.lower() in self.NAMES:
+                    if self._is_name(relation.l):
                         grammars.append(GrammaticalRelation('TO_LOC', NAME(relation.l)))
                     else:
                         grammars.append(GrammaticalRelation('TO_LOC', NOUN(relation.l)))
                 else:
-                    if relation.r.lower() in self.NAMES:
+                    if self._is_name(relation.r):
                         grammars.append(GrammaticalRelation('TO_LOC', NAME(relation.r)))
                     else:
                         grammars.append(GrammaticalRelation('TO_LOC', NOUN(relation.r)))
             elif relation.relation_type == 'in_loc':
                 grammars.append(GrammaticalRelation('IN_LOC', NAME(relation.l)))
             elif relation.relation_type == 'from_loc':
-                if relation.l.lower() in self.NAMES:
+                if self._is_name(relation.l):
                     grammars.append(GrammaticalRelation('FROM_LOC', NAME(relation.l)))
                 else:
                     grammars.append(GrammaticalRelation('FROM_LOC', NOUN(relation.l)))
@@ -278,20 +382,16 @@ class DependencyParser(object):
                     grammars.append(GrammaticalRelation('AT_TIME', NAME(relation.r)))
                 else:
                     grammars.append(GrammaticalRelation('WH_TIME ?', 't1'))
+                    has_wh_time = True
             elif relation.relation_type == 'run_time':
                 grammars.append(GrammaticalRelation('RUN_TIME', NAME(relation.r)))
             elif relation.relation_type == 'query_time':
-                if 'WH_TIME ?' in [grammar.type for grammar in grammars]:
+                if has_wh_time:
                     continue
                 type = 'WH_TIME_COUNT ?'
                 alias = 't1'
                 grammars.append(GrammaticalRelation(type, alias))
-        grammar_len = len(grammars)
-        while grammar_len > 0:
-            grammars = self.postprocess_grammar(grammars)
-            if len(grammars) == grammar_len:
-                break
-            grammar_len = len(grammars)
+        grammars = self.postprocess_grammar(grammars)
         if self.yes_no_case(grammars):
             grammars.append(GrammaticalRelation('YES_NO', 'NONE'))
         return grammars
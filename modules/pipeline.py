@@ -0,0 +1,104 @@
+import collections
+import json
+import os
+import sys
+import time
+
+from .answer import AnswerError
+
+
+def serialize_answer(output, structured=False):
+    if structured:
+        # rows only: the prose and the intermediate artefacts are never rendered
+        return output.structured()
+    return {
+        'relations': [relation.__str__() for relation in output['relations']],
+        'grammatical_relations': [grammar.__str__() for grammar in
+                                  output['grammatical_relations']],
+        'logical_forms': {key: ' '.join(loc.__str__() for loc in logical_form)
+                          for key, logical_form in output['logical_forms'].items()
+                          if logical_form},
+        'procedural_semantics': [p_sem.__str__() for p_sem in output['procedural_semantics']],
+        'output': output['output'],
+        'row_count': output['row_count']
+    }
+
+
+def read_questions(path):
+    # '-' reads from stdin; lines are yielded one by one, never the whole file
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in f:
+            question = line.strip()
+            if question:
+                yield question
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def stream_answers(qa, questions, workers=1, batch_size=1024):
+    # answer_stream keeps input order, so the questions it has consumed but not yet
+    # answered are exactly the head of this queue (at most two batches)
+    pending = collections.deque()
+
+    def feed():
+        for question in questions:
+            pending.append(question)
+            yield question
+
+    for output in qa.answer_stream(feed(), workers=workers, batch_size=batch_size):
+        yield pending.popleft(), output
+
+
+class JSONLSink(object):
+    def __init__(self, path, flush_interval=1.0, buffer_size=1 << 16):
+        self.path = path
+        self.flush_interval = flush_interval
+        if path == '-':
+            self.file = sys.stdout
+        else:
+            self.file = open(path, 'a', encoding='utf-8', buffering=buffer_size)
+        self.count = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.file.flush()
+            self._last_flush = now
+
+    def close(self):
+        self.file.flush()
+        if self.file is not sys.stdout:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def run_stream(qa, input_path, output_path, workers=1, batch_size=1024, flush_interval=1.0,
+               structured=False):
+    sink = JSONLSink(output_path, flush_interval=flush_interval)
+    try:
+        with sink:
+            for question, output in stream_answers(qa, read_questions(input_path), workers,
+                                                   batch_size):
+                record = {'question': question}
+                if isinstance(output, AnswerError):
+                    record['error'] = output.error
+                else:
+                    record.update(serialize_answer(output, structured))
+                sink.write(record)
+    except BrokenPipeError:
+        if output_path != '-':
+            raise
+        # the reader went away ('| head'): stop quietly like other command line tools, and
+        # point stdout at devnull so the flush at interpreter exit does not fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return sink.count
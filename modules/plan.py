@@ -0,0 +1,51 @@
+from collections import namedtuple
+
+from .cache import LRUCache
+from .schema import TIME_COLUMNS, parse_time
+from .semantics import OpProceduralSemantic
+
+
+class QueryPlan(namedtuple('QueryPlan', ['key', 'predicates', 'airline', 'projection'])):
+    __slots__ = ()
+
+    def execute(self, store):
+        return store.select(self.predicates, self.airline)
+
+    def __str__(self):
+        return self.key
+
+
+class QueryPlanner(object):
+    def __init__(self, airlines, cache_size=1024):
+        self.airlines = airlines
+        self.cache = LRUCache(cache_size)
+
+    def compile(self, procedural_semantics):
+        key = '\n'.join(p_sem.__str__() for p_sem in procedural_semantics)
+        plan = self.cache.get(key)
+        if plan is None:
+            plan = self._compile(key, procedural_semantics)
+            self.cache.put(key, plan)
+        return plan
+
+    def _compile(self, key, procedural_semantics):
+        query_procedure = procedural_semantics[0]
+        if isinstance(procedural_semantics[1], OpProceduralSemantic):
+            condition = procedural_semantics[1].p_sems[1]
+        else:
+            condition = procedural_semantics[1]
+
+        predicates = []
+        airline = None
+        if condition.flight in self.airlines:
+            airline = condition.flight
+        elif condition.flight:
+            predicates.append(('FLIGHT', condition.flight))
+        if condition.time != '?t1' and condition.type in TIME_COLUMNS:
+            predicates.append((condition.type, parse_time(condition.time)))
+        if condition.start_place:
+            predicates.append(('SOURCE', condition.start_place))
+        if condition.end_place:
+            predicates.append(('DEST', condition.end_place))
+        projection = (query_procedure.type, query_procedure.object, condition.type)
+        return QueryPlan(key, tuple(predicates), airline, projection)
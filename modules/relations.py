@@ -1,4 +1,6 @@
 class GrammaticalRelation(object):
+    __slots__ = ('type', 'token')
+
     def __init__(self, type, token):
         self.type = type
         self.token = token
@@ -8,6 +10,8 @@ class GrammaticalRelation(object):
 
 
 class NAME(GrammaticalRelation):
+    __slots__ = ('idx', 'org_token', 'alias')
+
     def __init__(self, token):
         super(NAME, self).__init__('NAME', token)
         self.idx = 1
@@ -17,6 +21,8 @@ class NAME(GrammaticalRelation):
 
 
 class NOUN(GrammaticalRelation):
+    __slots__ = ('idx', 'org_token', 'alias')
+
     def __init__(self, token):
         super(NOUN, self).__init__('NOUN', token)
         self.idx = 1
@@ -26,6 +32,8 @@ class NOUN(GrammaticalRelation):
 
 
 class OpRelation(GrammaticalRelation):
+    __slots__ = ('relations',)
+
     def __init__(self, relations, op):
         super(OpRelation, self).__init__(op, relations)
         self.relations = relations
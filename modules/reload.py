@@ -0,0 +1,140 @@
+import csv
+import os
+import threading
+import time
+
+from .database import source_fingerprint
+from .schema import COLUMNS, TIME_COLUMNS, parse_time
+from .snapshot import load_flight_store
+
+# delta files are CSVs with an extra OP column; 'delete' rows only need FLIGHT
+UPSERT_OPS = ('insert', 'update', 'upsert')
+DELETE_OPS = ('delete',)
+
+
+def read_delta(path):
+    # every problem is a ValueError naming the file and line, so poll() keeps the current table
+    upserts = {}
+    deletes = set()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        try:
+            fieldnames = reader.fieldnames or []
+            for column in ('OP', 'FLIGHT'):
+                if column not in fieldnames:
+                    raise ValueError('{}:1: missing {} column'.format(path, column))
+            missing = [column for column in COLUMNS if column not in fieldnames]
+            for line, row in enumerate(reader, 2):
+                if None in row or None in row.values():
+                    raise ValueError('{}:{}: expected {} fields'.format(path, line,
+                                                                        len(fieldnames)))
+                op = row['OP'].strip().lower()
+                flight = row['FLIGHT'].strip()
+                if not flight:
+                    raise ValueError('{}:{}: missing FLIGHT'.format(path, line))
+                if op in UPSERT_OPS:
+                    if missing:
+                        raise ValueError('{}:{}: {} needs the {} columns'.format(
+                            path, line, op, ', '.join(missing)))
+                    record = {column: row[column].strip() for column in COLUMNS}
+                    for column in COLUMNS:
+                        if not record[column]:
+                            raise ValueError('{}:{}: empty {}'.format(path, line, column))
+                    for column in TIME_COLUMNS:
+                        if parse_time(record[column]) is None:
+                            raise ValueError('{}:{}: invalid {} value: {!r}'.format(
+                                path, line, column, record[column]))
+                    # a later row for the same flight wins, like applying the rows one by one
+                    upserts[flight] = record
+                elif op in DELETE_OPS:
+                    upserts.pop(flight, None)
+                    deletes.add(flight)
+                else:
+                    raise ValueError('{}:{}: unknown OP {!r}'.format(path, line, row['OP']))
+        except csv.Error as e:
+            raise ValueError('{}:{}: {}'.format(path, reader.line_num, e))
+    return list(upserts.values()), deletes
+
+
+class DatabaseReloader(object):
+    def __init__(self, database_path, delta_dir=None, interval=None):
+        self.database_path = database_path
+        self.delta_dir = delta_dir
+        # seconds between two checks of the files, None only loads once
+        self.interval = interval
+        self.reloads = 0
+        self.deltas_applied = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._csv_mtime = None
+        self._source = None
+        self._applied = set()
+
+    def load(self):
+        source = source_fingerprint(self.database_path)
+        mtime = source[1]
+        store, applied = self._apply_deltas(load_flight_store(self.database_path), mtime, set())
+        self._csv_mtime = mtime
+        self._source = source
+        self._applied = applied
+        return store
+
+    def pending_deltas(self, csv_mtime=None, applied=None):
+        # deltas older than the CSV are assumed to be folded into it already
+        csv_mtime = self._csv_mtime if csv_mtime is None else csv_mtime
+        applied = self._applied if applied is None else applied
+        if not self.delta_dir or not os.path.isdir(self.delta_dir):
+            return []
+        pending = []
+        for name in sorted(os.listdir(self.delta_dir)):
+            if not name.endswith('.csv'):
+                continue
+            path = os.path.join(self.delta_dir, name)
+            mtime = os.stat(path).st_mtime_ns
+            if mtime >= csv_mtime and (name, mtime) not in applied:
+                pending.append((path, (name, mtime)))
+        return pending
+
+    def _apply_deltas(self, store, csv_mtime, applied):
+        # all or nothing: a failing delta leaves the recorded state untouched for the retry
+        applied = set(applied)
+        pending = self.pending_deltas(csv_mtime, applied)
+        for path, key in pending:
+            upserts, deletes = read_delta(path)
+            store = store.apply_delta(upserts, deletes)
+            applied.add(key)
+        self.deltas_applied += len(pending)
+        return store, applied
+
+    def poll(self, store, force=False):
+        # returns the updated store, or None when nothing changed (or another thread is on it)
+        now = time.monotonic()
+        if not force and (self.interval is None or now < self._next_check):
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            self._next_check = now + (self.interval or 0.0)
+            try:
+                if source_fingerprint(self.database_path) != self._source:
+                    updated = self.load()
+                    self.reloads += 1
+                else:
+                    updated, self._applied = self._apply_deltas(store, self._csv_mtime,
+                                                                self._applied)
+            except (OSError, ValueError) as e:
+                # a half-written file: keep serving the current table and retry next time
+                self.last_error = e
+                return None
+            self.last_error = None
+            return updated if updated is not store else None
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        return {
+            'reloads': self.reloads,
+            'deltas_applied': self.deltas_applied,
+            'last_error': None if self.last_error is None else str(self.last_error)
+        }
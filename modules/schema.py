@@ -0,0 +1,19 @@
+import re
+
+STRING_COLUMNS = ['FLIGHT', 'SOURCE', 'DEST']
+TIME_COLUMNS = ['DTIME', 'ATIME', 'RUNTIME']
+COLUMNS = ['FLIGHT', 'DTIME', 'ATIME', 'RUNTIME', 'SOURCE', 'DEST']
+AIRLINES = ['VJ', 'VN']
+TIME_PATTERN = re.compile(r"^\s*(\d{1,2}):([0-5][0-9])\s*$")
+
+
+def parse_time(text):
+    # '13:30' -> 810 minutes since midnight, durations use the same encoding
+    match = TIME_PATTERN.match(text)
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def format_time(minutes):
+    return '{}:{:02d}'.format(minutes // 60, minutes % 60)
@@ -0,0 +1,116 @@
+import re
+
+from .parser import DependencyParser
+
+UPPER = 'A-ZÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬĐÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴ'
+# the abbreviation, word and punctuation rules of underthesea's regex pre-tokenizer that
+# flight questions hit: 'TP.Hồ' and 'TP.' stay whole, 'Tp.' is split off, ':' stands alone
+SYLLABLE_PATTERN = re.compile(
+    r"[{0}]+(?:\.[{0}{1}]+)+\.?|[A-ZĐ]+\.(?!$)|Tp\.|\w+|:+|[^\w\s]".format(UPPER, UPPER.lower()))
+_END = None
+
+
+class TrieSegmenter(object):
+    # part of the parse cache key: bump when the segmentation rules change
+    VERSION = 2
+    # in-domain words the parser vocabularies do not list on their own
+    DOMAIN_LEXICON = [
+        'máy', 'hàng không', 'hãng', 'hãng hàng không', 'thời gian', 'chuyến bay', 'sân bay',
+        'cất cánh', 'khởi hành', 'thành phố', 'mã hiệu', 'cho', 'biết', 'mấy', 'giờ', 'không',
+        'phút', 'và', 'hoặc', 'là', 'đi', 'tới', 'về', 'lúc', 'vào', 'bao nhiêu', 'bao lâu',
+        'mất', 'có', 'các', 'những', 'của', 'hãy'
+    ]
+
+    def __init__(self, lexemes, fallback=None):
+        # syllable trie: each node maps a lowercased syllable to the next node, _END marks a word
+        self.trie = {}
+        for lexeme in lexemes:
+            self.add(lexeme)
+        # fallback(sentence) -> tokens, used when a sentence has an unknown multi-syllable span
+        self.fallback = fallback
+        self.sentences = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_parser(cls, parser_class=DependencyParser, lexicon_path=None, fallback=None):
+        lexemes = list(parser_class.lexicon()) + list(cls.DOMAIN_LEXICON)
+        if lexicon_path is not None:
+            lexemes.extend(read_lexicon(lexicon_path))
+        return cls(lexemes, fallback)
+
+    def add(self, lexeme):
+        node = self.trie
+        for syllable in lexeme.lower().replace('_', ' ').split():
+            node = node.setdefault(syllable, {})
+        node[_END] = True
+
+    @staticmethod
+    def _is_word(syllable):
+        # codes, numbers and time pieces ('VN1', '13', '30HR') are never merged with neighbours
+        return syllable[0].isalpha() and not any(char.isdigit() for char in syllable)
+
+    def segment(self, sentence):
+        matches = list(SYLLABLE_PATTERN.finditer(sentence))
+        syllables = [match.group() for match in matches]
+        lowered = [syllable.lower() for syllable in syllables]
+        # underthesea keeps an upper-case abbreviation followed by a space ('TP. Hồ') apart
+        # from the next word, but joins 'Tp. Hồ' and 'TP.Hồ'
+        closed = [syllable.endswith('.') and syllable[:-1].isupper() and
+                  sentence[match.end():match.end() + 1].isspace()
+                  for syllable, match in zip(syllables, matches)]
+        tokens = []
+        unknown_run = 0
+        idx = 0
+        while idx < len(syllables):
+            # greedy longest match starting at idx
+            node = self.trie
+            end = None
+            position = idx
+            while position < len(lowered):
+                node = node.get(lowered[position])
+                if node is None:
+                    break
+                position += 1
+                if _END in node:
+                    end = position
+                if closed[position - 1]:
+                    break
+            if end is None:
+                end = idx + 1
+                if self._is_word(syllables[idx]):
+                    unknown_run += 1
+                    if unknown_run > 1:
+                        return None
+                else:
+                    unknown_run = 0
+            else:
+                unknown_run = 0
+            tokens.append(' '.join(syllables[idx:end]))
+            idx = end
+        return tokens
+
+    def __call__(self, sentence):
+        self.sentences += 1
+        tokens = self.segment(sentence)
+        if tokens is None:
+            if self.fallback is None:
+                raise ValueError('unknown multi-syllable span in {!r}'.format(sentence))
+            self.fallbacks += 1
+            tokens = self.fallback(sentence)
+        return tokens
+
+    def stats(self):
+        return {
+            'sentences': self.sentences,
+            'fallbacks': self.fallbacks,
+            'fallback_rate': self.fallbacks / self.sentences if self.sentences else 0.0
+        }
+
+
+def read_lexicon(path):
+    # one lexeme per line, syllables separated by spaces or '_'; '#' starts a comment
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
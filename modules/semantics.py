@@ -1,4 +1,6 @@
 class OpProceduralSemantic(object):
+    __slots__ = ('p_sems', 'op')
+
     def __init__(self, p_sems, op):
         self.p_sems = p_sems
         self.op = op
@@ -8,6 +10,8 @@ class OpProceduralSemantic(object):
 
 
 class ProceduralSemantic(object):
+    __slots__ = ('type', 'object', 'flight', 'start_place', 'end_place', 'time')
+
     def __init__(self, type=None, object=None, flight=None, start_place=None, end_place=None,
                  time=None):
         self.type = type
@@ -22,6 +26,8 @@ class ProceduralSemantic(object):
             self.time = '?t1'
         if self.time.endswith('giờ'):
             self.time = f"{self.time[:-4]}:00HR"
+        if 'hr' in self.time.lower():
+            self.time = self.time.lower().replace('hr', '')
 
         if self.type == 'PRINT-ALL' and object == '?t1':
             self.object = '?t1'
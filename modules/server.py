@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from .pipeline import serialize_answer
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super(HTTPError, self).__init__(message or status.phrase)
+        self.status = status
+
+
+class QAServer(object):
+    MAX_BODY_SIZE = 1 << 20
+
+    def __init__(self, qa, host='127.0.0.1', port=8000, executor=None):
+        self.qa = qa
+        self.host = host
+        self.port = port
+        # the NLP pipeline is CPU bound, keep it off the event loop
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.routes = {
+            '/answer': self.handle_answer,
+            '/answer_batch': self.handle_answer_batch
+        }
+
+    def _answer(self, question, limit=None, offset=0, structured=False):
+        return serialize_answer(self.qa.answer(question, limit, offset), structured)
+
+    async def answer(self, question, limit=None, offset=0, structured=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._answer, question, limit, offset,
+                                          structured)
+
+    @staticmethod
+    def _is_count(value):
+        # JSON true/false arrive as bool, which is an int subclass
+        return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+    @classmethod
+    def _options(cls, payload):
+        limit = payload.get('limit')
+        offset = payload.get('offset', 0)
+        if limit is not None and not cls._is_count(limit):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'limit' must be a non-negative integer")
+        if not cls._is_count(offset):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'offset' must be a non-negative integer")
+        structured = payload.get('structured', False)
+        if not isinstance(structured, bool):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'structured' must be a boolean")
+        return limit, offset, structured
+
+    async def handle_answer(self, payload):
+        question = payload.get('question')
+        if not isinstance(question, str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'question' must be a string")
+        return await self.answer(question, *self._options(payload))
+
+    async def handle_answer_batch(self, payload):
+        questions = payload.get('questions')
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'questions' must be a list of strings")
+        limit, offset, structured = self._options(payload)
+        answers = await asyncio.gather(*(self.answer(question, limit, offset, structured)
+                                         for question in questions))
+        return {'answers': answers}
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'invalid Content-Length')
+        if length > self.MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return method, path.split('?', 1)[0], body, keep_alive
+
+    async def _dispatch(self, method, path, body):
+        if path == '/metrics':
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            if self.qa.metrics is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, 'metrics are disabled')
+            return self.qa.metrics.to_prometheus()
+        handler = self.routes.get(path)
+        if handler is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+        if method != 'POST':
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        try:
+            payload = json.loads(body.decode('utf-8') or '{}')
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'body must be JSON')
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'body must be a JSON object')
+        return await handler(payload)
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            body = payload.encode('utf-8')
+        else:
+            content_type = 'application/json; charset=utf-8'
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = ('HTTP/1.1 {} {}\r\n'
+                'Content-Type: {}\r\n'
+                'Content-Length: {}\r\n'
+                'Connection: {}\r\n\r\n').format(status.value, status.phrase, content_type,
+                                                 len(body),
+                                                 'keep-alive' if keep_alive else 'close')
+        writer.write(head.encode('latin-1') + body)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                method = path = None
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    status, payload = HTTPStatus.OK, await self._dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.args[0]}
+                except Exception:
+                    # the details stay in the server log, the client only learns it failed
+                    logger.exception('error while answering %s %s', method, path)
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {'error': status.phrase}
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(qa, host='127.0.0.1', port=8000, threads=1):
+    server = QAServer(qa, host, port, ThreadPoolExecutor(max_workers=threads))
+    print('Serving on http://{}:{}'.format(host, port), flush=True)
+    asyncio.run(server.serve_forever())
@@ -0,0 +1,154 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from .database import FlightIndex, FlightStore, source_fingerprint
+from .schema import COLUMNS, STRING_COLUMNS
+
+# layout: MAGIC | u64 header length | JSON header | arrays, each aligned to ALIGNMENT bytes
+MAGIC = b'FLIGHTS1'
+ALIGNMENT = 64
+SUFFIX = '.snapshot'
+
+
+class MappedVocabulary(object):
+    def __init__(self, offsets, blob):
+        # UTF-8 values concatenated in sorted order; byte order matches str order
+        self.offsets = offsets
+        self.blob = blob
+
+    def _value_bytes(self, code):
+        return self.blob[self.offsets[code]:self.offsets[code + 1]].tobytes()
+
+    def encode(self, value):
+        target = value.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._value_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._value_bytes(low) == target:
+            return low
+        return None
+
+    def decode(self, codes):
+        return [self._value_bytes(code).decode('utf-8') for code in codes.tolist()]
+
+    def __iter__(self):
+        for code in range(len(self)):
+            yield self._value_bytes(code).decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def snapshot_path(database_path):
+    return os.path.splitext(database_path)[0] + SUFFIX
+
+
+def _snapshot_arrays(store):
+    arrays = {}
+    for column in COLUMNS:
+        arrays[column] = store.columns[column]
+        keys, starts, order = store.index.columns[column]
+        arrays[column + '.keys'] = keys
+        arrays[column + '.starts'] = starts
+        arrays[column + '.order'] = order
+    for column in STRING_COLUMNS:
+        encoded = [value.encode('utf-8') for value in store.vocabularies[column]]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        arrays[column + '.offsets'] = offsets
+        arrays[column + '.blob'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    for airline, rows in store.index.airlines.items():
+        arrays['airline.' + airline] = rows
+    return arrays
+
+
+def write_snapshot(store, path, source=None):
+    arrays = _snapshot_arrays(store)
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = [array.dtype.newbyteorder('<').str, offset, len(array)]
+        offset += array.nbytes
+    # source is the fingerprint of the CSV the store was built from, see load_flight_store
+    header = json.dumps({'rows': len(store), 'source': source,
+                         'arrays': layout}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    # write next to the target and rename, so readers never see a partial file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][1])
+            f.write(array.astype(layout[name][0], copy=False).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def open_snapshot(path):
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a flight snapshot'.format(path))
+    header_length, = struct.unpack_from('<Q', buffer, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(buffer[header_start:header_start + header_length].decode('utf-8'))
+    data_start = -(-(header_start + header_length) // ALIGNMENT) * ALIGNMENT
+
+    # read-only views straight onto the mapping, shared between processes by the page cache
+    arrays = {name: np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + offset)
+              for name, (dtype, offset, count) in header['arrays'].items()}
+    columns = {column: arrays[column] for column in COLUMNS}
+    vocabularies = {column: MappedVocabulary(arrays[column + '.offsets'], arrays[column + '.blob'])
+                    for column in STRING_COLUMNS}
+    index = FlightIndex(header['rows'],
+                        {column: (arrays[column + '.keys'], arrays[column + '.starts'],
+                                  arrays[column + '.order'])
+                         for column in COLUMNS},
+                        {name[len('airline.'):]: array for name, array in arrays.items()
+                         if name.startswith('airline.')})
+    store = FlightStore(columns, vocabularies, index)
+    store.buffer = buffer
+    store.source = header.get('source')
+    return store
+
+
+def load_flight_store(database_path):
+    # reuse the snapshot only if it was built from exactly this CSV; comparing mtimes with >=
+    # misses a schedule deployed with an older preserved mtime (rsync -t, cp -p, archives)
+    path = snapshot_path(database_path)
+    source = source_fingerprint(database_path)
+    try:
+        store = open_snapshot(path)
+        if store.source == source:
+            return store
+    except (OSError, ValueError):
+        pass
+    # fingerprinted before reading, so a CSV rewritten mid-build is rebuilt next time
+    store = FlightStore.from_csv(database_path)
+    try:
+        write_snapshot(store, path, source)
+    except OSError:
+        return store
+    return open_snapshot(path)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Convert a flight CSV into a binary snapshot')
+    arg_parser.add_argument('database_path')
+    arg_parser.add_argument('-o', '--output', default=None)
+    args = arg_parser.parse_args()
+    output_path = args.output or snapshot_path(args.database_path)
+    source = source_fingerprint(args.database_path)
+    write_snapshot(FlightStore.from_csv(args.database_path), output_path, source)
+    print('{} -> {}'.format(args.database_path, output_path))
@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import queue
+import sqlite3
+
+from .database import FlightIndex, FlightRecord, RecordRows, read_records, source_fingerprint
+from .schema import COLUMNS, TIME_COLUMNS, parse_time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS flights (
+    FLIGHT TEXT NOT NULL,
+    DTIME INTEGER NOT NULL,
+    ATIME INTEGER NOT NULL,
+    RUNTIME INTEGER NOT NULL,
+    SOURCE TEXT NOT NULL,
+    DEST TEXT NOT NULL,
+    AIRLINE TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+# one index per predicate column, plus the route pair most questions filter on together
+INDEXES = [(column,) for column in COLUMNS] + [('AIRLINE',), ('SOURCE', 'DEST')]
+SELECT_COLUMNS = ', '.join(COLUMNS)
+
+_memory_databases = itertools.count()
+
+
+class ConnectionPool(object):
+    def __init__(self, path, size=4, timeout=30.0):
+        if path == ':memory:':
+            # a private in-memory database that every pooled connection can see
+            path = 'file:flights-{}?mode=memory&cache=shared'.format(next(_memory_databases))
+        elif not path.startswith('file:'):
+            path = 'file:{}'.format(path)
+        self.path = path
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(sqlite3.connect(path, timeout=timeout, uri=True,
+                                           check_same_thread=False))
+        self.size = size
+
+    @contextlib.contextmanager
+    def connection(self):
+        # blocks while every connection is busy, which bounds the concurrent queries
+        connection = self._idle.get()
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+class SQLRows(RecordRows):
+    # the rows of one query; counts and pages are pushed down to SQLite, rows fetched on demand
+    def __init__(self, store, where, parameters, offset=0, limit=None):
+        self.store = store
+        self.where = where
+        self.parameters = parameters
+        self.offset = offset
+        self.limit = limit
+        self._records = None
+        self._count = None
+        self._pages = {}
+
+    @property
+    def rows(self):
+        if self._records is None:
+            sql = 'SELECT {} FROM flights{} ORDER BY rowid LIMIT ? OFFSET ?'.format(
+                SELECT_COLUMNS, self.where)
+            limit = -1 if self.limit is None else self.limit
+            self._records = [FlightRecord._make(row) for row in
+                             self.store.execute(sql, self.parameters + [limit, self.offset])]
+        return self._records
+
+    @property
+    def empty(self):
+        # answered from the COUNT, which the answer needs anyway, not by fetching every row
+        return len(self) == 0
+
+    def __len__(self):
+        if self._records is not None:
+            return len(self._records)
+        if self._count is None:
+            total = self.store.execute('SELECT COUNT(*) FROM flights{}'.format(self.where),
+                                       self.parameters)[0][0]
+            count = max(total - self.offset, 0)
+            self._count = count if self.limit is None else min(count, self.limit)
+        return self._count
+
+    def page(self, offset=0, limit=None):
+        # pages are kept, so a page fetched ahead of time is not queried again when rendered
+        page = self._pages.get((offset, limit))
+        if page is None:
+            window = limit
+            if self.limit is not None:
+                remaining = max(self.limit - offset, 0)
+                window = remaining if limit is None else min(limit, remaining)
+            page = SQLRows(self.store, self.where, self.parameters, self.offset + offset, window)
+            self._pages[(offset, limit)] = page
+        return page
+
+
+class SQLFlightStore(object):
+    # a FlightStore stand-in: same select(predicates, airline), rows stay in SQLite
+    def __init__(self, path, pool_size=4, timeout=30.0):
+        self.pool = ConnectionPool(path, pool_size, timeout)
+        with self.pool.connection() as connection:
+            connection.executescript(SCHEMA)
+        self._where = {}
+
+    @classmethod
+    def from_records(cls, records, path, pool_size=4, source=None):
+        rows = []
+        for record in records:
+            row = [record[column] for column in COLUMNS]
+            for column in TIME_COLUMNS:
+                position = COLUMNS.index(column)
+                row[position] = parse_time(row[position])
+                if row[position] is None:
+                    raise ValueError('invalid {} value: {!r}'.format(column, record[column]))
+            rows.append(row)
+        return cls.from_rows(rows, path, pool_size, source)
+
+    @classmethod
+    def from_csv(cls, csv_path, path, pool_size=4):
+        # fingerprinted before reading, so a CSV rewritten mid-build is rebuilt next time
+        source = source_fingerprint(csv_path)
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            return cls.from_records(read_records(f, csv_path), path, pool_size, source)
+
+    @classmethod
+    def from_store(cls, flight_store, path, pool_size=4):
+        # the columns are already decoded to codes, places and int minutes
+        return cls.from_rows(zip(*(flight_store.values(column) for column in COLUMNS)), path,
+                             pool_size)
+
+    @classmethod
+    def from_rows(cls, rows, path, pool_size=4, source=None):
+        # rows in COLUMNS order with times as minutes; replaces the table and builds the indexes.
+        # source is the fingerprint of the CSV they came from, see open_sql_store
+        store = cls(path, pool_size)
+        with store.pool.connection() as connection:
+            with connection:
+                connection.execute('DELETE FROM flights')
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)",
+                                   (json.dumps(source),))
+                connection.executemany('INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                       (list(row) + [cls.airline(row[0])] for row in rows))
+                for columns in INDEXES:
+                    connection.execute('CREATE INDEX IF NOT EXISTS flights_{} ON flights ({})'
+                                       .format('_'.join(columns).lower(), ', '.join(columns)))
+            connection.execute('ANALYZE')
+        return store
+
+    @staticmethod
+    def airline(flight):
+        # same prefix rule as the in-memory airline index
+        match = FlightIndex.AIRLINE_PATTERN.match(flight)
+        return match.group().upper() if match else None
+
+    @property
+    def source(self):
+        rows = self.execute("SELECT value FROM meta WHERE key = 'source'", [])
+        return json.loads(rows[0][0]) if rows else None
+
+    def execute(self, sql, parameters):
+        # the sqlite3 statement cache keeps each distinct SQL text prepared per connection
+        with self.pool.connection() as connection:
+            return connection.execute(sql, parameters).fetchall()
+
+    def _where_clause(self, columns):
+        # one SQL text per set of filtered columns, so prepared statements are reused
+        where = self._where.get(columns)
+        if where is None:
+            where = ' WHERE ' + ' AND '.join('{} = ?'.format(column) for column in columns) \
+                if columns else ''
+            self._where[columns] = where
+        return where
+
+    def select(self, predicates, airline=None):
+        columns = tuple(column for column, _ in predicates)
+        parameters = [value for _, value in predicates]
+        if airline:
+            columns += ('AIRLINE',)
+            parameters.append(airline)
+        return SQLRows(self, self._where_clause(columns), parameters)
+
+    def __len__(self):
+        return self.execute('SELECT COUNT(*) FROM flights', [])[0][0]
+
+    def close(self):
+        self.pool.close()
+
+
+def open_sql_store(database_path, path, pool_size=4):
+    # reuse the SQLite file only if it was built from exactly this CSV; comparing mtimes with
+    # >= misses a schedule deployed with an older preserved mtime (rsync -t, cp -p, archives)
+    if os.path.exists(path):
+        store = SQLFlightStore(path, pool_size)
+        if store.source == source_fingerprint(database_path):
+            return store
+        store.close()
+    # build next to the target and rename, so other processes never open a partial file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    SQLFlightStore.from_csv(database_path, tmp_path, pool_size=1).close()
+    os.replace(tmp_path, path)
+    return SQLFlightStore(path, pool_size)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Load a flight CSV into indexed SQLite')
+    arg_parser.add_argument('database_path')
+    arg_parser.add_argument('output')
+    args = arg_parser.parse_args()
+    store = SQLFlightStore.from_csv(args.database_path, args.output, pool_size=1)
+    print('{} -> {} ({} rows)'.format(args.database_path, args.output, len(store)))
+    store.close()
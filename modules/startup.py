@@ -0,0 +1,41 @@
+import importlib
+import sys
+import threading
+import time
+
+_START = time.perf_counter()
+import_times = {}
+events = {}
+# reentrant: importing one lazy module may lazily import another
+_import_lock = threading.RLock()
+
+
+def lazy_import(name):
+    # sys.modules already holds a module while another thread is still executing it, so
+    # only a fully initialized module may skip the lock
+    module = sys.modules.get(name)
+    if module is not None and not getattr(module.__spec__, '_initializing', False):
+        return module
+    with _import_lock:
+        if name in sys.modules:
+            # importlib waits for an import still running in a plain 'import' statement
+            return importlib.import_module(name)
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        import_times[name] = time.perf_counter() - start
+    return module
+
+
+def mark(event):
+    # only the first occurrence of an event counts towards startup
+    if event not in events:
+        events[event] = time.perf_counter() - _START
+
+
+def report():
+    lines = ['Startup report:']
+    for name, seconds in sorted(import_times.items(), key=lambda item: -item[1]):
+        lines.append('  import {:<28} {:9.1f} ms'.format(name, seconds * 1000))
+    for event, seconds in sorted(events.items(), key=lambda item: item[1]):
+        lines.append('  {:<35} {:9.1f} ms after start'.format(event, seconds * 1000))
+    return '\n'.join(lines)
@@ -1,45 +1,153 @@
-from underthesea import word_tokenize
+import hashlib
+import re
+import threading
+import unicodedata
+from importlib import metadata
+
+from . import startup
+from .cache import LRUCache
 
 
 class Tokenizer(object):
-    def __init__(self):
-        self.tokenizer = word_tokenize
+    # substring -> replacement on the raw sentence, all applied in one regex pass
+    REWRITES = [
+        ('Thời gian', ''), ('các', ''), ('những', ''), ('Hãy', ''), ('mất', ''), ('có', ''),
+        ('Có', ''), ('của', ''), ('VietJet Air', 'VietJetAir')
+    ]
+    # adjacent (lowercased) tokens joined with '_'; NUMBER stands for any run of digits
+    NUMBER = '<number>'
+    MERGES = [
+        ('cho', 'biết'),
+        ('mấy', 'giờ'),
+        (NUMBER, 'giờ'),
+        ('hãng', 'hàng_không')
+    ]
+
+    BACKENDS = ['underthesea', 'trie']
+
+    def __init__(self, cache_size=4096, backend='underthesea', lexicon_path=None,
+                 parser_class=None):
+        if backend not in self.BACKENDS:
+            raise ValueError('unknown tokenizer backend {!r}'.format(backend))
+        # 'trie' segments in-domain sentences by longest match, see modules/segmenter.py
+        self.backend = backend
+        self.lexicon_path = lexicon_path
+        # the trie is built from this parser's vocabularies, None is DependencyParser
+        self.parser_class = parser_class
+        self._tokenizer = None
+        self._word_tokenize = None
+        # the first sentences may arrive on several threads at once
+        self._lock = threading.Lock()
+        self.cache = LRUCache(cache_size)
+
+    def word_tokenize(self, sentence):
+        # underthesea takes seconds to import, so defer it until a sentence needs it
+        if self._word_tokenize is None:
+            with self._lock:
+                if self._word_tokenize is None:
+                    self._word_tokenize = startup.lazy_import('underthesea').word_tokenize
+        return self._word_tokenize(sentence)
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None and self.backend == 'trie':
+                    segmenter = startup.lazy_import('modules.segmenter')
+                    self._tokenizer = segmenter.TrieSegmenter.from_parser(
+                        self.parser_class or segmenter.DependencyParser,
+                        lexicon_path=self.lexicon_path, fallback=self.word_tokenize)
+                elif self._tokenizer is None:
+                    self._tokenizer = self.word_tokenize
+        return self._tokenizer
+
+    @staticmethod
+    def normalize(sentence):
+        return ' '.join(unicodedata.normalize('NFC', sentence).split())
+
+    def rules_fingerprint(self):
+        # the segmenter is part of the rules: its version, or the trie lexicon, change the tokens
+        rules = [self.backend, self.REWRITES, self.MERGES]
+        if self.backend == 'trie':
+            segmenter = startup.lazy_import('modules.segmenter')
+            rules.append((segmenter.TrieSegmenter.VERSION, segmenter.SYLLABLE_PATTERN.pattern,
+                          segmenter.TrieSegmenter.DOMAIN_LEXICON))
+            if self.lexicon_path is not None:
+                rules.append(sorted(segmenter.read_lexicon(self.lexicon_path)))
+        try:
+            rules.append(metadata.version('underthesea'))
+        except metadata.PackageNotFoundError:
+            rules.append(None)
+        return hashlib.sha256(repr(rules).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def rewrite_pattern(cls):
+        # one alternation for every rewrite, compiled once per class; longer keys win ties
+        pattern = cls.__dict__.get('_rewrite_pattern')
+        if pattern is None:
+            cls._rewrites = dict(cls.REWRITES)
+            keys = sorted(cls._rewrites, key=len, reverse=True)
+            pattern = re.compile('|'.join(re.escape(key) for key in keys))
+            cls._rewrite_pattern = pattern
+        return pattern
+
+    @classmethod
+    def merge_table(cls):
+        table = cls.__dict__.get('_merge_table')
+        if table is None:
+            table = frozenset(cls.MERGES)
+            cls._merge_table = table
+        return table
 
     def tokenize_raw(self, sentence):
-        removed_tokens = ['Thời gian', 'các', 'những', 'Hãy', 'mất', 'có', 'Có', 'của']
-        for token in removed_tokens:
-            sentence = sentence.replace(token, '')
-        sentence = sentence.replace('VietJet Air', 'VietJetAir')
+        pattern = self.rewrite_pattern()
+        sentence = pattern.sub(lambda match: self._rewrites[match.group()], sentence)
         doc = self.tokenizer(sentence)
         tokens = [token.replace(' ', '_') for token in doc]
         if tokens[-2] == 'không':
             tokens.pop(-2)
         return tokens
 
-    @staticmethod
-    def _token_combine(tokens, token_a, token_b):
-        for idx, token in enumerate(tokens):
-            if token.lower() == token_a and idx + 1 < len(tokens) and \
-                    tokens[idx + 1].lower() == token_b:
-                tokens[idx] = '{}_{}'.format(token_a, token_b)
-                tokens.pop(idx + 1)
-        return tokens
+    def _merge(self, token_a, token_b):
+        token_a = token_a.lower()
+        token_b = token_b.lower()
+        key_a = self.NUMBER if token_a.isascii() and token_a.isdigit() else token_a
+        if (key_a, token_b) in self.merge_table():
+            return '{}_{}'.format(token_a, token_b)
+        return None
+
+    def merge_tokens(self, tokens):
+        # one left-to-right pass: bigram merges, plus joining the first 'a', ':', 'b' into 'a:b'
+        merged = []
+        seen_colon = False
+        idx = 0
+        while idx < len(tokens):
+            token = tokens[idx]
+            if token == ':' and not seen_colon and merged and idx + 1 < len(tokens):
+                # handle case: '13:30HR'
+                seen_colon = True
+                right = tokens[idx + 1]
+                pair = self._merge(right, tokens[idx + 2]) if idx + 2 < len(tokens) else None
+                merged[-1] = merged[-1] + ':' + (pair or right)
+                idx += 3 if pair else 2
+                continue
+            pair = self._merge(token, tokens[idx + 1]) if idx + 1 < len(tokens) else None
+            if pair:
+                merged.append(pair)
+                idx += 2
+            else:
+                merged.append(token)
+                idx += 1
+        return merged
 
     def tokenize(self, sentence):
-        tokenized_text = self.tokenize_raw(sentence)
-        # handle case [..., 'cho', 'biết', ...] -> [..., 'cho_biết', ...]
-        tokenized_text = self._token_combine(tokenized_text, 'cho', 'biết')
-        # handle case [..., 'mấy', 'giờ', ...] -> [..., 'mấy_giờ', ...]
-        tokenized_text = self._token_combine(tokenized_text, 'mấy', 'giờ')
-        # handle case [..., '1', 'giờ', ...] -> [..., '1_giờ', ...]
-        tokenized_text = self._token_combine(tokenized_text, '1', 'giờ')
-        # handle case [..., 'hãng', 'hàng_không', ...] -> [..., 'hãng_hàng_không', ...]
-        tokenized_text = self._token_combine(tokenized_text, 'hãng', 'hàng_không')
-        if ':' in tokenized_text:
-            # handle case: '13:30HR'
-            # replace token_a, ':', token_b by 'token_a:token_b'
-            idx = tokenized_text.index(':')
-            tokenized_text[idx - 1] = tokenized_text[idx - 1] + ':' + tokenized_text[idx + 1]
-            tokenized_text.pop(idx)
-            tokenized_text.pop(idx)
-        return tokenized_text
+        # callers mutate the token list, so never hand out the cached one
+        sentence = self.normalize(sentence)
+        tokens = self.cache.get(sentence)
+        if tokens is None:
+            tokens = self._tokenize(sentence)
+            self.cache.put(sentence, tuple(tokens))
+        return list(tokens)
+
+    def _tokenize(self, sentence):
+        return self.merge_tokens(self.tokenize_raw(sentence))
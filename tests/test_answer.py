@@ -0,0 +1,62 @@
+import os
+import pickle
+
+import pytest
+
+from benchmarks.generate import write_flights
+from main import QuestionAnswering
+from modules.pipeline import serialize_answer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTIONS = ['Máy bay nào bay đến Huế ?', 'Máy bay nào bay đến Huế lúc mấy giờ ?',
+             'Máy bay VN4 có xuất phát từ Đà Nẵng không ?', 'Máy bay nào bay từ Hà Nội đến Hà Nội ?']
+
+
+@pytest.fixture(scope='module', params=['memory', 'sql'])
+def qa(request, tmp_path_factory):
+    directory = tmp_path_factory.mktemp(request.param)
+    database = str(directory / 'flights.csv')
+    write_flights(database, 2000)
+    sql_database_path = str(directory / 'f.sqlite') if request.param == 'sql' else None
+    return QuestionAnswering(database, sql_database_path=sql_database_path)
+
+
+@pytest.mark.parametrize('question', QUESTIONS)
+@pytest.mark.parametrize('limit, offset', [(None, 0), (5, 0), (5, 12), (3, 10000)])
+def test_pickled_answers_render_like_the_original(qa, question, limit, offset):
+    answer = qa.answer(question, limit, offset)
+    copy = pickle.loads(pickle.dumps(answer))
+    assert copy.row_count == answer.row_count
+    assert copy['output'] == answer['output']
+    assert copy.records == answer.records
+    assert copy.structured() == answer.structured()
+    assert serialize_answer(copy) == serialize_answer(answer)
+
+
+def test_pickles_only_the_requested_page(qa):
+    full = len(pickle.dumps(qa.answer(QUESTIONS[0])))
+    page = len(pickle.dumps(qa.answer(QUESTIONS[0], limit=5, offset=20)))
+    assert qa.answer(QUESTIONS[0]).row_count > 100
+    assert page * 5 < full
+
+
+def test_pickling_renders_nothing_up_front(qa):
+    answer = qa.answer(QUESTIONS[0], limit=5)
+    state = answer.__getstate__()
+    assert state['_records'] is None
+    assert state['result'].rows.rows == answer.records
+    assert len(state['result'].rows) == answer.row_count
+
+
+def test_paging_keeps_one_rendered_page(qa):
+    result = qa.answer(QUESTIONS[0]).result
+    texts = [result.text(5, offset) for offset in range(0, 100, 5)]
+    assert len(set(texts)) == 20
+    assert result._text == ((5, 95), texts[-1])
+    assert result.text(5, 95) is texts[-1]
+
+
+def test_worker_answers_match(qa):
+    questions = QUESTIONS * 3
+    assert [answer['output'] for answer in qa.answer_many(questions, workers=2)] == \
+        [qa.answer(question)['output'] for question in questions]
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import threading
+
+from main import QuestionAnswering
+from modules.async_api import MemoryBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(ROOT, 'input', 'database.csv')
+with open(os.path.join(ROOT, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+    QUESTIONS = f.read().splitlines()
+
+
+def _collect(api, questions, **kwargs):
+    async def run():
+        return [answer async for answer in api.answer_stream(questions, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_memory_backend_queries_off_the_event_loop():
+    qa = QuestionAnswering(DATABASE)
+    threads = []
+    query_plan = qa.query_plan
+
+    def recording_query_plan(plan):
+        threads.append(threading.current_thread())
+        return query_plan(plan)
+
+    qa.query_plan = recording_query_plan
+    plan = qa.planner.compile(qa.parse(QUESTIONS[0])[3])
+
+    async def run():
+        result = await MemoryBackend(qa).query(plan)
+        return result, threading.current_thread()
+
+    result, loop_thread = asyncio.run(run())
+    assert threads and threads[0] is not loop_thread
+    assert result.text() == qa.answer(QUESTIONS[0])['output']
+
+
+def test_answer_stream_matches_answer_in_input_order():
+    expected = [answer['output'] for answer in QuestionAnswering(DATABASE).answer_many(QUESTIONS)]
+    api = QuestionAnswering(DATABASE).async_api(max_concurrency=3)
+    answers = _collect(api, QUESTIONS * 2)
+    assert [answer['output'] for answer in answers] == expected * 2
+
+
+def test_answer_stream_pages_like_answer():
+    qa = QuestionAnswering(DATABASE)
+    answers = _collect(qa.async_api(), QUESTIONS, limit=1, offset=1)
+    assert [answer['output'] for answer in answers] == \
+        [qa.answer(question, limit=1, offset=1)['output'] for question in QUESTIONS]
+
+
+def test_cold_api_warms_up_once_before_fanning_out():
+    qa = QuestionAnswering(DATABASE)
+    calls = []
+    warm_up = qa.warm_up
+
+    def counting_warm_up(front_end=True):
+        calls.append(front_end)
+        warm_up(front_end)
+
+    qa.warm_up = counting_warm_up
+    api = qa.async_api(max_concurrency=8)
+    answers = _collect(api, QUESTIONS)
+    assert calls == [True]
+    assert all(answer['output'] for answer in answers)
+    _collect(api, QUESTIONS[:2])
+    assert calls == [True]
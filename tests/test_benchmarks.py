@@ -0,0 +1,31 @@
+import os
+
+from benchmarks.generate import QuestionGenerator, generate_flights
+from benchmarks.run import compare, run
+from main import QuestionAnswering
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_generators_are_seeded():
+    assert list(QuestionGenerator(seed=5).questions(50)) == \
+        list(QuestionGenerator(seed=5).questions(50))
+    assert list(generate_flights(50, seed=5)) == list(generate_flights(50, seed=5))
+    assert list(generate_flights(50, seed=5)) != list(generate_flights(50, seed=6))
+
+
+def test_generated_questions_are_answerable():
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+    for question in QuestionGenerator(seed=0).questions(200):
+        assert qa.answer(question)['output'], question
+
+
+def test_run_and_compare(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    current = run(questions=20, scales=[10, 100], seed=1, tokenizer_backend='trie')
+    assert current['meta']['scales'] == [10, 100]
+    assert set(current['results']['database']) == {'10', '100'}
+    report = compare(current, current)
+    assert len(report.splitlines()) > 10
+    assert all(line.endswith('1.00') or line.endswith('nan')
+               for line in report.splitlines()[1:])
@@ -0,0 +1,50 @@
+import threading
+import unicodedata
+
+from modules.cache import LRUCache
+from modules.tokenizer import Tokenizer
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 1, 'evictions': 1}
+
+
+def test_zero_size_disables_the_cache():
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    assert len(cache) == 0 and cache.get('a') is None
+
+
+def test_lru_is_bounded_under_concurrent_use():
+    cache = LRUCache(64)
+
+    def run(offset):
+        for key in range(offset, offset + 2000):
+            cache.put(key % 200, key)
+            cache.get((key * 7) % 200)
+
+    threads = [threading.Thread(target=run, args=(offset,)) for offset in range(0, 8000, 1000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats['size'] == 64
+    assert stats['hits'] + stats['misses'] == 16000
+
+
+def test_tokenizer_memoizes_normalized_sentences():
+    tokenizer = Tokenizer(cache_size=8)
+    tokens = tokenizer.tokenize('Máy bay nào bay đến Huế ?')
+    tokens.append('mutated')
+    # NFD input and extra spaces normalize to the same key
+    again = tokenizer.tokenize('Máy bay  nào bay đến Huế ? ')
+    assert again == tokens[:-1]
+    assert tokenizer.cache.stats()['hits'] == 1
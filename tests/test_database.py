@@ -0,0 +1,123 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from benchmarks.generate import generate_flights, write_flights
+from modules.database import FlightRecord, FlightStore, code_dtype, format_times
+from modules.schema import COLUMNS, TIME_COLUMNS, format_time, parse_time
+
+RECORDS = list(generate_flights(3000, seed=2))
+
+
+@pytest.fixture(scope='module')
+def store():
+    return FlightStore.from_records(RECORDS)
+
+
+def _scan(records, predicates, airline=None):
+    # the reference: a full scan over the decoded rows
+    rows = []
+    for idx, record in enumerate(records):
+        values = dict(record)
+        for column in TIME_COLUMNS:
+            values[column] = parse_time(values[column])
+        if all(values[column] == value for column, value in predicates) and \
+                (airline is None or values['FLIGHT'].startswith(airline)):
+            rows.append(idx)
+    return rows
+
+
+def _queries():
+    record = RECORDS[17]
+    values = {column: record[column] for column in COLUMNS}
+    for column in TIME_COLUMNS:
+        values[column] = parse_time(values[column])
+    for size in range(0, 4):
+        for columns in itertools.combinations(['SOURCE', 'DEST', 'DTIME', 'ATIME', 'RUNTIME'],
+                                              size):
+            yield tuple((column, values[column]) for column in columns), None
+    yield (('DEST', values['DEST']),), 'VJ'
+    yield (('DEST', values['DEST']),), 'VN'
+    yield (('FLIGHT', values['FLIGHT']),), None
+    yield (('DEST', 'NOWHERE'),), None
+    yield (('RUNTIME', 70000),), None
+    yield (), 'XX'
+
+
+@pytest.mark.parametrize('predicates, airline', list(_queries()))
+def test_index_lookup_matches_a_full_scan(store, predicates, airline):
+    rows = store.select(predicates, airline)
+    # in table order, like the original DataFrame filter
+    assert rows.rows.tolist() == _scan(RECORDS, predicates, airline)
+    assert rows.empty == (len(rows) == 0)
+
+
+@pytest.mark.parametrize('text, minutes', [('0:00', 0), ('1:00', 60), ('13:30', 810),
+                                           (' 4:05 ', 245), ('23:59', 1439)])
+def test_times_round_trip_through_minutes(text, minutes):
+    assert parse_time(text) == minutes
+    assert format_time(minutes) == text.strip()
+
+
+@pytest.mark.parametrize('text', ['13:3', '13:60', '1330', '13:30HR', ''])
+def test_invalid_times(text):
+    assert parse_time(text) is None
+    with pytest.raises(ValueError):
+        FlightStore.from_records([dict(RECORDS[0], DTIME=text)])
+
+
+def test_time_columns_are_int16_minutes(store):
+    for column in TIME_COLUMNS:
+        assert store.columns[column].dtype == np.int16
+        assert store.values(column, np.arange(5)) == \
+            [parse_time(record[column]) for record in RECORDS[:5]]
+    rows = store.select((('DTIME', parse_time(RECORDS[3]['DTIME'])),))
+    assert rows.formatted('DTIME') == [RECORDS[3]['DTIME']] * len(rows)
+    assert format_times(np.array([60, 5, 60], dtype=np.int16)) == ['1:00', '0:05', '1:00']
+
+
+def test_columns_are_dictionary_encoded(store):
+    for column in ['FLIGHT', 'SOURCE', 'DEST']:
+        vocabulary = list(store.vocabularies[column])
+        assert vocabulary == sorted(set(record[column] for record in RECORDS))
+        assert store.columns[column].dtype == code_dtype(len(vocabulary))
+        assert store.values(column) == [record[column] for record in RECORDS]
+    assert store.columns['SOURCE'].dtype == np.uint8
+    assert store.mask('DEST', 'HUE').tolist() == [record['DEST'] == 'HUE' for record in RECORDS]
+    assert not store.mask('DEST', 'NOWHERE').any()
+
+
+def test_records_and_pages(store):
+    rows = store.select((('DEST', 'HUE'),))
+    records = rows.records()
+    assert records[0] == FlightRecord(*(parse_time(RECORDS[rows.rows[0]][column])
+                                        if column in TIME_COLUMNS else
+                                        RECORDS[rows.rows[0]][column] for column in COLUMNS))
+    assert rows.page(3, 4).records() == records[3:7]
+    assert rows.page(len(rows) + 1).empty
+
+
+def test_from_csv_matches_from_records(tmp_path, store):
+    path = str(tmp_path / 'flights.csv')
+    write_flights(path, 3000, seed=2)
+    loaded = FlightStore.from_csv(path)
+    for column in COLUMNS:
+        assert loaded.values(column) == store.values(column)
+
+
+def test_apply_delta_matches_a_rebuilt_table(store):
+    upserts = [dict(RECORDS[10], DTIME='1:00', ATIME='2:00', RUNTIME='1:00'),
+               dict(RECORDS[0], FLIGHT='ZZ1', SOURCE='NEWTOWN')]
+    deletes = {RECORDS[5]['FLIGHT'], 'NOT-A-FLIGHT'}
+    updated = store.apply_delta(upserts, deletes)
+    replaced = {RECORDS[10]['FLIGHT'], RECORDS[5]['FLIGHT']}
+    expected = FlightStore.from_records(
+        [record for record in RECORDS if record['FLIGHT'] not in replaced] + upserts)
+    for column in COLUMNS:
+        assert updated.values(column) == expected.values(column)
+        assert list(updated.vocabularies.get(column, [])) == \
+            list(expected.vocabularies.get(column, []))
+    assert updated.select((('SOURCE', 'NEWTOWN'),))['FLIGHT'] == ['ZZ1']
+    # the old store is untouched, queries still holding it are not disturbed
+    assert len(store) == len(RECORDS) and store.encode('SOURCE', 'NEWTOWN') is None
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from benchmarks.generate import write_flights
+from main import QuestionAnswering
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NO_RESULT = 'Dạ thưa, không tìm thấy kết quả phù hợp'
+QUESTION = 'Máy bay nào bay đến Huế ?'
+
+
+@pytest.fixture(scope='module', params=['memory', 'sql'])
+def qa(request, tmp_path_factory):
+    directory = tmp_path_factory.mktemp(request.param)
+    database = str(directory / 'flights.csv')
+    write_flights(database, 500)
+    sql_database_path = str(directory / 'f.sqlite') if request.param == 'sql' else None
+    return QuestionAnswering(database, sql_database_path=sql_database_path)
+
+
+def test_in_repo_queries_match_the_golden_outputs():
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+    with open(os.path.join(ROOT, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+        questions = f.read().splitlines()
+    for idx, question in enumerate(questions):
+        with open(os.path.join(ROOT, 'output', 'output_{}.txt'.format(idx)), 'r',
+                  encoding='utf-8') as f:
+            expected = f.read().split('\nOutput:\n', 1)[1]
+        assert qa.answer(question)['output'] + '\n' == expected, question
+
+
+def test_pages_report_their_range(qa):
+    count = qa.answer(QUESTION)['row_count']
+    assert count > 20
+    answer = qa.answer(QUESTION, limit=10, offset=5)
+    flights = answer['output'].split('máy bay ', 1)[1].split('\n')[0].split(',')
+    assert len(flights) == 10
+    assert answer['output'].endswith('(hiển thị 6-15 trên tổng số {} kết quả)'.format(count))
+    last = qa.answer(QUESTION, limit=10, offset=count - 3)['output']
+    assert last.endswith('(hiển thị {}-{} trên tổng số {} kết quả)'.format(count - 2, count,
+                                                                           count))
+
+
+@pytest.mark.parametrize('offset_past_end, limit', [(0, 10), (7, 10), (0, None), (3, 0)])
+def test_pages_past_the_end_have_no_results(qa, offset_past_end, limit):
+    count = qa.answer(QUESTION)['row_count']
+    offset = count + offset_past_end if limit != 0 else offset_past_end
+    answer = qa.answer(QUESTION, limit=limit, offset=offset)
+    assert answer['output'] == NO_RESULT
+    assert answer['row_count'] == count
+    assert answer.records == []
+
+
+def test_answer_many_keeps_the_input_order_across_workers():
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+    with open(os.path.join(ROOT, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+        questions = f.read().splitlines() * 3
+    expected = [qa.answer(question)['output'] for question in questions]
+    for workers, chunksize in [(2, None), (3, 1), (None, 4)]:
+        answers = qa.answer_many(questions, workers=workers, chunksize=chunksize)
+        assert [answer['output'] for answer in answers] == expected
+    assert qa.answer_many([], workers=4) == []
+
+
+def test_paraphrases_share_one_cached_result():
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+    first = qa.answer('Máy bay nào bay đến Huế ?')
+    second = qa.answer('Máy bay nào hạ cánh ở Huế ?')
+    assert second.result is first.result
+    assert qa.answer_cache.stats()['hits'] == 1
+
+
+def test_a_new_table_drops_the_cached_answers():
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+    first = qa.answer('Máy bay nào bay đến Huế ?')
+    version = qa.database_version
+    qa.database = qa.database.apply_delta(deletes=['VN1'])
+    assert qa.database_version == version + 1 and len(qa.answer_cache) == 0
+    assert qa.answer('Máy bay nào bay đến Huế ?')['output'] == \
+        'Dạ thưa, kết quả câu hỏi là: máy bay VJ1'
+    assert first['output'] == 'Dạ thưa, kết quả câu hỏi là: máy bay VN1,VJ1'
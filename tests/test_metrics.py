@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+
+from main import QuestionAnswering
+from modules.metrics import Histogram, StageMetrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_histogram_quantiles_fall_in_the_right_bucket():
+    histogram = Histogram(buckets=[1.0, 2.0, 4.0])
+    for value in [0.5] * 50 + [1.5] * 45 + [3.0] * 5:
+        histogram.observe(value)
+    assert histogram.counts == [50, 45, 5, 0]
+    assert 0.0 < histogram.quantile(0.5) <= 1.0
+    assert 1.0 < histogram.quantile(0.95) <= 2.0
+    assert 2.0 < histogram.quantile(0.99) <= 4.0
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_concurrent_observations_are_all_counted():
+    metrics = StageMetrics()
+
+    def run():
+        for _ in range(1000):
+            metrics.observe('parse', 1e-4)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.snapshot()['parse']['count'] == 8000
+
+
+def test_answer_times_every_stage():
+    metrics = StageMetrics()
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'), metrics=metrics)
+    untimed = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+    question = 'Máy bay nào bay đến Huế ?'
+    assert qa.answer(question)['output'] == untimed.answer(question)['output']
+    snapshot = json.loads(metrics.to_json())
+    assert all(snapshot[stage]['count'] == 1 for stage in StageMetrics.STAGES)
+    prometheus = metrics.to_prometheus()
+    assert 'qa_stage_duration_seconds_count{stage="total"} 1' in prometheus
+    assert 'qa_stage_duration_seconds_bucket{stage="parse",le="+Inf"} 1' in prometheus
+
+
+
+def test_worker_timings_are_merged_into_the_parent():
+    with open(os.path.join(ROOT, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+        questions = f.read().splitlines()
+    metrics = StageMetrics()
+    qa = QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'), metrics=metrics)
+    answers = qa.answer_many(questions, workers=2)
+    assert [answer['output'] for answer in answers] == \
+        [answer['output'] for answer in QuestionAnswering(qa.database_path).answer_many(questions)]
+    snapshot = metrics.snapshot()
+    assert all(snapshot[stage]['count'] == len(questions) for stage in StageMetrics.STAGES)
+    assert snapshot['total']['sum'] > 0.0
+    list(qa.answer_stream(questions, workers=2, batch_size=4))
+    assert metrics.snapshot()['total']['count'] == 2 * len(questions)
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+
+from main import QuestionAnswering
+from modules.metrics import StageMetrics
+from modules.parse_cache import ParseCache, rules_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(ROOT, 'input', 'database.csv')
+QUESTION = 'Máy bay nào bay đến Huế ?'
+
+
+def test_put_get_and_rules_isolation(tmp_path):
+    path = str(tmp_path / 'parses.sqlite')
+    cache = ParseCache(path, rules_key('a'))
+    cache.put('q', ([1], [2], {'x': 3}, [4]))
+    assert cache.get('q') == ([1], [2], {'x': 3}, [4])
+    assert cache.get('other') is None
+    # entries written under other rules are never read
+    assert ParseCache(path, rules_key('b')).get('q') is None
+    assert cache.stats() == {'size': 1, 'maxsize': 100000, 'hits': 1, 'misses': 1, 'errors': 0}
+
+
+def test_evicts_the_least_recently_used(tmp_path):
+    cache = ParseCache(str(tmp_path / 'parses.sqlite'), 'rules', maxsize=10)
+    for idx in range(25):
+        cache.put('q{}'.format(idx), idx)
+    assert len(cache) <= 10
+    assert cache.get('q24') == 24 and cache.get('q0') is None
+
+
+def test_a_corrupt_entry_is_a_miss(tmp_path):
+    cache = ParseCache(str(tmp_path / 'parses.sqlite'), 'rules')
+    cache._connection().execute("INSERT INTO parses VALUES ('rules', 'q', x'00', 0)")
+    assert cache.get('q') is None
+    assert cache.stats()['errors'] == 1
+
+
+def _write_many(path, offset):
+    cache = ParseCache(path, 'rules', maxsize=1000)
+    for idx in range(200):
+        cache.put('q{}'.format(offset + idx), offset + idx)
+        cache.get('q{}'.format(idx))
+    return cache.errors
+
+
+def test_shared_by_threads_and_processes(tmp_path):
+    path = str(tmp_path / 'parses.sqlite')
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        errors = pool.starmap(_write_many, [(path, offset) for offset in range(0, 800, 200)])
+    cache = ParseCache(path, 'rules', maxsize=2000)
+    threads = [threading.Thread(target=_write_many, args=(path, offset))
+               for offset in range(800, 1600, 200)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [0] * 4
+    assert len(cache) == 1000 and cache.get('q1234') == 1234
+
+
+def test_a_warm_cache_skips_the_front_end(tmp_path):
+    path = str(tmp_path / 'parses.sqlite')
+    expected = QuestionAnswering(DATABASE, parse_cache_path=path).answer(QUESTION)['output']
+    code = ('import sys, main; qa = main.QuestionAnswering({!r}, parse_cache_path={!r}); '
+            'print(qa.answer({!r})["output"]); print("underthesea" in sys.modules)'
+            ).format(DATABASE, path, QUESTION)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    assert output.decode('utf-8').splitlines() == [expected, 'False']
+
+
+def test_parse_cache_hits_are_their_own_stage(tmp_path):
+    metrics = StageMetrics()
+    qa = QuestionAnswering(DATABASE, metrics=metrics,
+                           parse_cache_path=str(tmp_path / 'parses.sqlite'))
+    qa.answer(QUESTION)
+    qa.answer(QUESTION)
+    snapshot = metrics.snapshot()
+    assert snapshot['parse_cache']['count'] == 1
+    assert snapshot['tokenize']['count'] == 1 and snapshot['total']['count'] == 2
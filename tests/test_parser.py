@@ -0,0 +1,189 @@
+import os
+
+import pytest
+
+from main import QuestionAnswering, write_output
+from modules.parser import DependencyParser
+from modules.tokenizer import Tokenizer
+
+
+@pytest.fixture
+def parser_class():
+    # a subclass keeps the stock vocabularies and rules untouched
+    class Parser(DependencyParser):
+        pass
+    return Parser
+
+
+@pytest.mark.parametrize('tokens, tags', [
+    (['Máy_bay', 'nào', 'bay', 'từ', 'Huế', 'đến', 'Hà_Nội', '?'],
+     ['NOUNS', 'WH_WORDS', 'VERBS', 'FROM', 'NAMES', 'TO', 'NAMES', 'QUERY']),
+    (['Máy_bay', 'nào', 'đến', 'thành_phố', 'Huế', 'lúc', '13:30HR', '?'],
+     ['NOUNS', 'WH_WORDS', 'VERBS', 'NOUNS', 'NAMES', 'AT', 'TIMES_PATTERNS', 'QUERY']),
+    (['Máy_bay', 'VJ5', 'bay', '2_giờ', 'xyz'],
+     ['NOUNS', 'AIRLINE_PATTERNS', 'VERBS', 'TIME_DURATION_PATTERNS', 'OTHER'])
+])
+def test_pos_tagging(tokens, tags):
+    assert DependencyParser()._pos_tagging(tokens) == tags
+
+
+def test_lexicon_follows_the_tag_priority():
+    lexicon = DependencyParser.lexicon()
+    for tag in DependencyParser.TAG_ORDER:
+        for lexeme in getattr(DependencyParser, tag):
+            expected = next(candidate for candidate in DependencyParser.TAG_ORDER
+                            if lexeme in getattr(DependencyParser, candidate))
+            assert lexicon[lexeme] == expected
+
+
+def test_load_gazetteer(tmp_path, parser_class):
+    path = tmp_path / 'gazetteer.tsv'
+    path.write_text('# extra places\nđà lạt\tNAMES\tĐL\nvinh\tNAMES\tVII\n', encoding='utf-8')
+    fingerprint = parser_class.rules_fingerprint()
+    parser_class.load_gazetteer(str(path))
+    assert parser_class()._pos_tagging(['Đà_Lạt', 'vinh']) == ['NAMES', 'NAMES']
+    assert parser_class.NAMES_MAPPER['đà_lạt'] == 'ĐL'
+    assert parser_class.rules_fingerprint() != fingerprint
+    assert 'đà_lạt' not in DependencyParser.lexicon()
+    path.write_text('đà lạt\tPLACES\n', encoding='utf-8')
+    with pytest.raises(ValueError):
+        parser_class.load_gazetteer(str(path))
+
+
+@pytest.mark.parametrize('text, message', [
+    ('huế\tNAMES\tHUE\nđà lạt\tNAMES\n', ":2: NAMES entry 'đà lạt' needs a CODE"),
+    ('# no tag is NAMES\nvinh\n', ":2: NAMES entry 'vinh' needs a CODE"),
+    ('đà lạt\tNAMES\t\n', ":1: NAMES entry 'đà lạt' needs a CODE"),
+    ('đà lạt\tPLACES\tĐL\n', ":1: unknown tag 'PLACES'")
+])
+def test_load_gazetteer_rejects_incomplete_entries(tmp_path, parser_class, text, message):
+    path = tmp_path / 'gazetteer.tsv'
+    path.write_text(text, encoding='utf-8')
+    with pytest.raises(ValueError) as error:
+        parser_class.load_gazetteer(str(path))
+    assert str(error.value) == str(path) + message
+    assert 'đà_lạt' not in parser_class.lexicon()
+
+
+def test_question_answering_uses_the_parser_class(tmp_path, parser_class):
+    path = tmp_path / 'gazetteer.tsv'
+    path.write_text('đà lạt\tNAMES\tĐL\n', encoding='utf-8')
+    parser_class.load_gazetteer(str(path))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    qa = QuestionAnswering(os.path.join(root, 'input', 'database.csv'),
+                           tokenizer_backend='trie', parser_class=parser_class)
+    question = 'Máy bay nào bay đến Đà Lạt ?'
+    answer = qa.answer(question)
+    assert str(answer['procedural_semantics'][1]).endswith('ĐL ?t1)')
+    # the trie knows the new name too, so it never falls back to underthesea
+    assert qa.tokenizer.tokenizer.fallbacks == 0
+    assert [output['output'] for output in qa.answer_many([question] * 2, workers=2)] == \
+        [answer['output']] * 2
+
+
+def test_relation_table_keeps_the_first_rule_per_pair():
+    table = DependencyParser.relation_table()
+    seen = set()
+    for (pair, rel_type, action) in DependencyParser.RELATION_RULES:
+        if pair not in seen:
+            seen.add(pair)
+            assert table[pair][:2] == (rel_type, action)
+    assert len(table) == len(seen)
+
+
+@pytest.mark.parametrize('token_a, token_b, expected', [
+    (('Máy_bay', 'NOUNS'), ('nào', 'WH_WORDS'), 'WH_det(Máy_bay, nào)'),
+    (('nào', 'WH_WORDS'), ('Máy_bay', 'NOUNS'), 'WH_det(Máy_bay, nào)'),
+    (('Máy_bay', 'NOUNS'), ('bay', 'VERBS'), 'nsubj(bay, Máy_bay)'),
+    (('từ', 'FROM'), ('Huế', 'NAMES'), 'from_loc(Huế, từ)'),
+    (('đến', 'VERBS'), ('Huế', 'NAMES'), 'to_loc(đến, Huế)'),
+    (('bay', 'VERBS'), ('?', 'QUERY'), 'query(bay, ?)')
+])
+def test_check_relation(token_a, token_b, expected):
+    assert str(DependencyParser().check_relation(token_a, token_b)) == expected
+
+
+def test_no_rule_is_a_shift_or_reduce():
+    assert DependencyParser().check_relation(('Huế', 'NAMES'), ('?', 'QUERY')) is None
+
+
+def test_load_relation_rules(tmp_path, parser_class):
+    path = tmp_path / 'rules.tsv'
+    path.write_text('# extra\nNAMES\tQUERY\tend\tRA\nNOUNS\tWH_WORDS\tWH_det\tRA\n',
+                    encoding='utf-8')
+    parser_class.load_relation_rules(str(path))
+    parser = parser_class()
+    assert str(parser.check_relation(('Huế', 'NAMES'), ('?', 'QUERY'))) == 'end(Huế, ?)'
+    # repeating an existing rule is harmless
+    assert parser_class.relation_table()[('NOUNS', 'WH_WORDS')][:2] == ('WH_det', 'RA')
+    assert DependencyParser().check_relation(('Huế', 'NAMES'), ('?', 'QUERY')) is None
+
+
+@pytest.mark.parametrize('text, message', [
+    ('NAMES\tQUERY\tend\tUP\n', ":1: invalid relation rule 'NAMES\\tQUERY\\tend\\tUP'"),
+    ('# typo\nNAME\tQUERY\tend\tRA\n', ":2: unknown tag 'NAME'"),
+    ('NAMES\tQUERIES\tend\tRA\n', ":1: unknown tag 'QUERIES'"),
+    ('NOUNS\tWH_WORDS\tignored\tLA\n', ':1: NOUNS WH_WORDS already has the rule WH_det RA'),
+    ('NAMES\tQUERY\tend\tRA\nNAMES\tQUERY\tend\tLA\n',
+     ':2: NAMES QUERY already has the rule end RA')
+])
+def test_load_relation_rules_rejects_bad_rules(tmp_path, parser_class, text, message):
+    path = tmp_path / 'rules.tsv'
+    path.write_text(text, encoding='utf-8')
+    with pytest.raises(ValueError) as error:
+        parser_class.load_relation_rules(str(path))
+    assert str(error.value) == str(path) + message
+    assert parser_class.RELATION_RULES == DependencyParser.RELATION_RULES
+
+
+def test_every_builtin_rule_uses_known_tags():
+    assert all(tag in DependencyParser.TAGS
+               for pair, _, _ in DependencyParser.RELATION_RULES for tag in pair)
+
+
+def _golden():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+        questions = f.read().splitlines()
+    for idx, question in enumerate(questions):
+        with open(os.path.join(root, 'output', 'output_{}.txt'.format(idx)), 'r',
+                  encoding='utf-8') as f:
+            yield question, f.read()
+
+
+@pytest.mark.parametrize('question, expected', list(_golden()))
+def test_parse_matches_the_golden_relations(question, expected):
+    relations = DependencyParser().parse(Tokenizer().tokenize(question))
+    golden = expected.split('Relation:\n', 1)[1].split('\n\n', 1)[0].splitlines()
+    assert [str(relation) for relation in relations] == golden
+
+
+def test_parse_results_have_no_instance_dict():
+    parser = DependencyParser()
+    relations = parser.parse(Tokenizer().tokenize('Máy bay nào bay từ Huế đến Hà Nội ?'))
+    grammars = parser.construct_grammar(relations)
+    procedural_semantics = parser.construct_procedural_semantic(
+        parser.construct_logical_form(grammars))
+    for value in relations + grammars + procedural_semantics:
+        assert not hasattr(value, '__dict__'), type(value).__name__
+
+
+@pytest.mark.parametrize('question, expected', list(_golden()))
+def test_every_stage_matches_the_golden_output(tmp_path, question, expected):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = str(tmp_path / 'output.txt')
+    write_output(QuestionAnswering(os.path.join(root, 'input', 'database.csv')).answer(question),
+                 path)
+    with open(path, 'r', encoding='utf-8') as f:
+        assert f.read() == expected
+
+
+def test_construct_grammar_is_repeatable_and_leaves_relations_alone():
+    parser = DependencyParser()
+    relations = parser.parse(Tokenizer().tokenize(
+        'Thời gian Máy bay VJ5 bay từ TP. Hà Nội đến Khánh Hòa mất mấy giờ ?'))
+    first = [str(grammar) for grammar in parser.construct_grammar(relations)]
+    assert [str(grammar) for grammar in parser.construct_grammar(relations)] == first
+    assert [str(relation) for relation in relations] == \
+        [str(relation) for relation in parser.parse(Tokenizer().tokenize(
+            'Thời gian Máy bay VJ5 bay từ TP. Hà Nội đến Khánh Hòa mất mấy giờ ?'))]
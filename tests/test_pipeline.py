@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+from main import QuestionAnswering
+from modules.pipeline import run_stream, serialize_answer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(ROOT, 'input', 'database.csv')
+with open(os.path.join(ROOT, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+    QUESTIONS = f.read().splitlines()
+
+
+def _write_questions(tmp_path, questions):
+    path = str(tmp_path / 'questions.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(questions) + '\n\n')
+    return path
+
+
+def _read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_stream_appends_answers_in_input_order(tmp_path):
+    qa = QuestionAnswering(DATABASE)
+    questions = _write_questions(tmp_path, QUESTIONS)
+    output = str(tmp_path / 'answers.jsonl')
+    assert run_stream(qa, questions, output) == len(QUESTIONS)
+    assert run_stream(qa, questions, output, workers=2, batch_size=3) == len(QUESTIONS)
+    records = _read_jsonl(output)
+    expected = [dict(serialize_answer(qa.answer(question)), question=question)
+                for question in QUESTIONS]
+    assert records == expected * 2
+
+
+def test_run_stream_structured(tmp_path):
+    qa = QuestionAnswering(DATABASE)
+    output = str(tmp_path / 'answers.jsonl')
+    run_stream(qa, _write_questions(tmp_path, QUESTIONS), output, structured=True)
+    records = _read_jsonl(output)
+    assert [record['question'] for record in records] == QUESTIONS
+    assert all('output' not in record for record in records)
+    assert records[5]['kind'] == 'yes_no' and records[5]['answer'] is False
+
+
+def test_closed_stdout_stops_quietly(tmp_path):
+    # like '| head -1': the reader leaves after the first answer
+    questions = _write_questions(tmp_path, QUESTIONS * 300)
+    process = subprocess.Popen([sys.executable, 'main.py', '--stream', questions,
+                                '--stream-output', '-'], cwd=ROOT,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert json.loads(process.stdout.readline())['question'] == QUESTIONS[0]
+    process.stdout.close()
+    stderr = process.stderr.read().decode('utf-8')
+    assert process.wait() == 0
+    assert 'Traceback' not in stderr
+
+
+def test_a_failing_question_does_not_stop_the_stream(tmp_path):
+    qa = QuestionAnswering(DATABASE)
+    questions = QUESTIONS[:3] + ['Xin chào'] + QUESTIONS[3:]
+    path = _write_questions(tmp_path, questions)
+    for workers in (1, 2):
+        output = str(tmp_path / 'answers-{}.jsonl'.format(workers))
+        assert run_stream(qa, path, output, workers=workers, batch_size=4) == len(questions)
+        records = _read_jsonl(output)
+        assert [record['question'] for record in records] == questions
+        assert records[3] == {'question': 'Xin chào',
+                              'error': 'IndexError: list index out of range'}
+        assert all('error' not in record for record in records[:3] + records[4:])
+        assert records[4]['output'] == qa.answer(QUESTIONS[3])['output']
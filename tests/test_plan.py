@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from main import QuestionAnswering
+from modules.plan import QueryPlan, QueryPlanner
+from modules.schema import AIRLINES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def qa():
+    return QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+
+
+@pytest.mark.parametrize('question, predicates, airline, projection', [
+    ('Máy bay nào đến thành phố Huế lúc 13:30HR ?', (('ATIME', 810), ('DEST', 'HUE')), None,
+     ('PRINT-ALL', '?f1', 'ATIME')),
+    ('Máy bay nào bay từ Đà Nẵng đến TP. Hồ Chí Minh mất 1 giờ ?',
+     (('RUNTIME', 60), ('SOURCE', 'ĐN'), ('DEST', 'HCMC')), None,
+     ('PRINT-ALL', '?f1', 'RUNTIME')),
+    ('Máy bay VN4 có xuất phát từ Đà Nẵng không ?', (('FLIGHT', 'VN4'), ('SOURCE', 'ĐN')), None,
+     ('PRINT-YES-NO', '', 'DTIME')),
+    ('Máy bay của hãng hàng không VietJet Air bay đến những thành phố nào ?', (), 'VJ',
+     ('PRINT-ALL', '?d1', 'ATIME'))
+])
+def test_compile(qa, question, predicates, airline, projection):
+    plan = QueryPlanner(AIRLINES).compile(qa.parse(question)[3])
+    assert (plan.predicates, plan.airline, plan.projection) == (predicates, airline, projection)
+
+
+def test_plans_are_cached_immutable_and_reusable(qa):
+    planner = QueryPlanner(AIRLINES)
+    semantics = qa.parse('Máy bay nào bay đến Huế ?')[3]
+    plan = planner.compile(semantics)
+    assert planner.compile(qa.parse('Máy bay nào hạ cánh ở Huế ?')[3]) is plan
+    assert planner.cache.stats()['hits'] == 1
+    assert isinstance(plan, QueryPlan) and hash(plan) == hash(planner.compile(semantics))
+    with pytest.raises(AttributeError):
+        plan.airline = 'VN'
+    assert plan.execute(qa.database)['FLIGHT'] == ['VN1', 'VJ1']
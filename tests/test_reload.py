@@ -0,0 +1,104 @@
+import os
+import shutil
+
+import pytest
+
+from modules.reload import DatabaseReloader, read_delta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADER = 'OP,FLIGHT,DTIME,ATIME,RUNTIME,SOURCE,DEST\n'
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    return str(path)
+
+
+@pytest.fixture
+def reloader(tmp_path):
+    database = str(tmp_path / 'database.csv')
+    shutil.copy(os.path.join(ROOT, 'input', 'database.csv'), database)
+    # deltas must not be older than the CSV
+    os.utime(database, (0, 0))
+    os.mkdir(str(tmp_path / 'deltas'))
+    return DatabaseReloader(database, str(tmp_path / 'deltas'), interval=0.0)
+
+
+def test_read_delta_upserts_and_deletes(tmp_path):
+    path = _write(tmp_path / 'delta.csv', HEADER +
+                  'insert,VN9,8:00,9:00,1:00,HN,HUE\n'
+                  'update,VN9,8:30,9:30,1:00,HN,HUE\n'
+                  'delete,VN1,,,,,\n')
+    upserts, deletes = read_delta(path)
+    assert upserts == [{'FLIGHT': 'VN9', 'DTIME': '8:30', 'ATIME': '9:30', 'RUNTIME': '1:00',
+                        'SOURCE': 'HN', 'DEST': 'HUE'}]
+    assert deletes == {'VN1'}
+
+
+def test_read_delta_accepts_delete_only_files(tmp_path):
+    assert read_delta(_write(tmp_path / 'delta.csv', 'OP,FLIGHT\ndelete,VN1\n')) == \
+        ([], {'VN1'})
+
+
+@pytest.mark.parametrize('text, message', [
+    ('FLIGHT,DTIME\nVN1,8:00\n', ':1: missing OP column'),
+    ('OP,DTIME\ninsert,8:00\n', ':1: missing FLIGHT column'),
+    ('OP,FLIGHT\ninsert,VN9\n', ':2: insert needs the DTIME'),
+    (HEADER + 'insert,VN9,8:00\n', ':2: expected 7 fields'),
+    (HEADER + 'insert,VN9,8:00,9:00,1:00,HN,HUE,extra\n', ':2: expected 7 fields'),
+    (HEADER + 'insert,VN9,8:00,9:00,1:00,,HUE\n', ':2: empty SOURCE'),
+    (HEADER + 'insert,VN9,8:00,9h,1:00,HN,HUE\n', ":2: invalid ATIME value: '9h'"),
+    (HEADER + 'delete,VN1,,,,,\nrename,VN2,,,,,\n', ":3: unknown OP 'rename'"),
+    (HEADER + 'insert,,8:00,9:00,1:00,HN,HUE\n', ':2: missing FLIGHT')
+])
+def test_read_delta_rejects_malformed_files(tmp_path, text, message):
+    path = _write(tmp_path / 'delta.csv', text)
+    with pytest.raises(ValueError) as error:
+        read_delta(path)
+    assert str(error.value).startswith(path + message)
+
+
+def test_poll_applies_deltas(reloader):
+    store = reloader.load()
+    _write(os.path.join(reloader.delta_dir, '001.csv'),
+           HEADER + 'insert,VN9,8:00,9:00,1:00,HN,HUE\ndelete,VN1,,,,,\n')
+    updated = reloader.poll(store)
+    flights = updated.values('FLIGHT')
+    assert 'VN9' in flights and 'VN1' not in flights
+    assert len(updated) == len(store)
+    assert reloader.poll(updated) is None
+    assert reloader.stats()['deltas_applied'] == 1
+
+
+def test_malformed_delta_keeps_the_current_table(reloader):
+    store = reloader.load()
+    path = _write(os.path.join(reloader.delta_dir, '001.csv'), HEADER + 'insert,VN9,8:00\n')
+    assert reloader.poll(store) is None
+    assert reloader.stats()['last_error'].startswith(path + ':2:')
+    # the finished file is picked up on a later poll
+    _write(path, HEADER + 'insert,VN9,8:00,9:00,1:00,HN,HUE\n')
+    updated = reloader.poll(store)
+    assert 'VN9' in updated.values('FLIGHT')
+    assert reloader.last_error is None
+
+
+def test_truncated_csv_keeps_the_current_table(reloader):
+    store = reloader.load()
+    with open(reloader.database_path, 'a', encoding='utf-8') as f:
+        f.write('VN99,8:00\n')
+    # newer than the snapshot load() wrote, so the CSV itself is read again
+    os.utime(reloader.database_path, (os.path.getmtime(reloader.database_path) + 10,) * 2)
+    assert reloader.poll(store) is None
+    assert 'expected 6 fields' in reloader.stats()['last_error']
+
+
+def test_poll_reloads_a_csv_with_an_older_mtime(reloader):
+    store = reloader.load()
+    with open(reloader.database_path, encoding='utf-8') as f:
+        text = f.read()
+    _write(reloader.database_path, text.replace('VN3,', 'VN9,'))
+    os.utime(reloader.database_path, (0, 1))
+    updated = reloader.poll(store)
+    assert reloader.stats()['reloads'] == 1
+    assert 'VN3' not in updated.values('FLIGHT') and 'VN9' in updated.values('FLIGHT')
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from benchmarks.generate import QuestionGenerator
+from main import QuestionAnswering
+from modules.segmenter import TrieSegmenter
+from modules.tokenizer import Tokenizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(ROOT, 'input', 'database.csv')
+with open(os.path.join(ROOT, 'input', 'queries.txt'), 'r', encoding='utf-8') as f:
+    QUESTIONS = f.read().splitlines()
+
+
+@pytest.fixture(scope='module')
+def tokenizers():
+    return Tokenizer(), Tokenizer(backend='trie')
+
+
+@pytest.mark.parametrize('question', QUESTIONS)
+def test_in_repo_queries_parse_like_underthesea(question):
+    underthesea = QuestionAnswering(DATABASE)
+    trie = QuestionAnswering(DATABASE, tokenizer_backend='trie')
+    expected, answer = underthesea.answer(question), trie.answer(question)
+    assert trie.tokenizer.tokenize(question) == underthesea.tokenizer.tokenize(question)
+    assert [str(relation) for relation in answer['relations']] == \
+        [str(relation) for relation in expected['relations']]
+    assert answer['output'] == expected['output']
+
+
+@pytest.mark.parametrize('place, tokens', [
+    ('TP. Hồ Chí Minh', ['TP.', 'Hồ_Chí_Minh']),
+    ('Tp. Hồ Chí Minh', ['Tp._Hồ_Chí_Minh']),
+    ('TP.Hồ Chí Minh', ['TP.Hồ_Chí_Minh']),
+    ('Tp.Hồ Chí Minh', ['Tp._Hồ_Chí_Minh']),
+    ('TP. Hà Nội', ['TP.', 'Hà_Nội'])
+])
+def test_abbreviations(tokenizers, place, tokens):
+    question = 'Máy bay nào bay từ {} đến Huế ?'.format(place)
+    assert tokenizers[1].tokenize(question) == tokenizers[0].tokenize(question)
+    assert tokenizers[1].tokenize(question)[4:-3] == tokens
+
+
+def test_generated_questions_only_differ_where_the_crf_mis_segments(tokenizers):
+    underthesea, trie = tokenizers
+    for question in QuestionGenerator(seed=3).questions(300):
+        expected, tokens = underthesea.tokenize(question), trie.tokenize(question)
+        if tokens != expected:
+            # 'VN1_bay' or 'Khánh_Hòa_6': a code or number glued to a word
+            glued = [token for token in expected if token not in tokens]
+            assert any('_' in token and any(char.isdigit() for char in token)
+                       for token in glued), question
+    assert trie.tokenizer.stats()['fallbacks'] == 0
+
+
+def test_unknown_multi_syllable_spans_fall_back():
+    calls = []
+    segmenter = TrieSegmenter.from_parser(fallback=lambda sentence: calls.append(sentence) or [])
+    assert segmenter('Máy bay nào bay đến Huế ?') == ['Máy bay', 'nào', 'bay', 'đến', 'Huế', '?']
+    assert segmenter('Máy bay nào bay đến Buôn Ma Thuột ?') == []
+    assert calls == ['Máy bay nào bay đến Buôn Ma Thuột ?']
+    assert segmenter.stats()['fallback_rate'] == 0.5
+    with pytest.raises(ValueError):
+        TrieSegmenter.from_parser()('Máy bay nào bay đến Buôn Ma Thuột ?')
+
+
+def test_lexicon_file_extends_the_trie(tmp_path):
+    lexicon = tmp_path / 'lexicon.txt'
+    lexicon.write_text('# extra places\nbuôn ma thuột\n', encoding='utf-8')
+    segmenter = TrieSegmenter.from_parser(lexicon_path=str(lexicon))
+    assert segmenter('bay đến Buôn Ma Thuột ?') == ['bay', 'đến', 'Buôn Ma Thuột', '?']
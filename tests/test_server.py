@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from main import QuestionAnswering
+from modules.server import QAServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTION = 'Máy bay nào bay từ TP.Hồ Chí Minh đến Hà Nội ?'
+
+
+@pytest.fixture(scope='module')
+def qa():
+    return QuestionAnswering(os.path.join(ROOT, 'input', 'database.csv'))
+
+
+def _request(qa, head, body=b''):
+    # one request against a server on an ephemeral port; returns (status, payload)
+    async def run():
+        server = await asyncio.start_server(QAServer(qa).handle_connection, '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(
+                *server.sockets[0].getsockname()[:2])
+            writer.write(head.encode('latin-1') + b'\r\n\r\n' + body)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        status_line, _, rest = response.partition(b'\r\n')
+        return int(status_line.split()[1]), json.loads(rest.partition(b'\r\n\r\n')[2])
+    return asyncio.run(run())
+
+
+def _post(qa, payload, path='/answer'):
+    body = json.dumps(payload).encode('utf-8')
+    return _request(qa, 'POST {} HTTP/1.1\r\nConnection: close\r\nContent-Length: {}'.format(
+        path, len(body)), body)
+
+
+def test_answer(qa):
+    status, payload = _post(qa, {'question': QUESTION})
+    assert status == 200
+    assert payload['output'] == qa.answer(QUESTION)['output']
+
+
+def test_answer_batch_structured(qa):
+    status, payload = _post(qa, {'questions': [QUESTION] * 2, 'structured': True},
+                            '/answer_batch')
+    assert status == 200
+    assert payload['answers'] == [qa.answer_structured(QUESTION)] * 2
+
+
+@pytest.mark.parametrize('length', ['abc', '-5', '1.5'])
+def test_invalid_content_length_is_a_bad_request(qa, length):
+    status, payload = _request(qa, 'POST /answer HTTP/1.1\r\nContent-Length: {}'.format(length))
+    assert status == 400
+    assert payload == {'error': 'invalid Content-Length'}
+
+
+@pytest.mark.parametrize('payload', [{'question': 1}, {'question': QUESTION, 'limit': -1},
+                                     {'question': QUESTION, 'structured': 'yes'},
+                                     {'question': QUESTION, 'limit': True},
+                                     {'question': QUESTION, 'offset': False},
+                                     {'question': QUESTION, 'limit': 2.0}])
+def test_invalid_payload_is_a_bad_request(qa, payload):
+    assert _post(qa, payload)[0] == 400
+
+
+def test_unknown_path(qa):
+    assert _post(qa, {}, '/missing')[0] == 404
+
+
+def test_internal_errors_are_logged_not_sent(qa, caplog):
+    # 'Xin chào' fails inside the parser with an IndexError
+    status, payload = _post(qa, {'question': 'Xin chào'})
+    assert status == 500
+    assert payload == {'error': 'Internal Server Error'}
+    assert 'IndexError' in caplog.text and 'POST /answer' in caplog.text
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from benchmarks.generate import generate_flights, write_flights
+from modules.database import FlightStore
+from modules.schema import COLUMNS
+from modules.snapshot import load_flight_store, open_snapshot, snapshot_path, write_snapshot
+
+
+@pytest.fixture
+def store():
+    # non-ASCII places exercise the byte-ordered vocabulary search
+    return FlightStore.from_records(generate_flights(1500, seed=4))
+
+
+def test_snapshot_round_trip(tmp_path, store):
+    path = str(tmp_path / 'flights.snapshot')
+    write_snapshot(store, path)
+    mapped = open_snapshot(path)
+    assert len(mapped) == len(store)
+    for column in COLUMNS:
+        assert mapped.values(column) == store.values(column)
+    for column, vocabulary in store.vocabularies.items():
+        assert list(mapped.vocabularies[column]) == list(vocabulary)
+        for code, value in enumerate(vocabulary):
+            assert mapped.encode(column, value) == code
+        assert mapped.encode(column, 'NOT-A-VALUE') is None
+    for predicates, airline in [((('DEST', 'ĐN'),), None), ((('SOURCE', 'HN'),), 'VJ'),
+                                ((), 'VN'), ((('FLIGHT', 'VN7'),), None)]:
+        assert mapped.select(predicates, airline).records() == \
+            store.select(predicates, airline).records()
+
+
+def test_snapshot_is_read_only(tmp_path, store):
+    path = str(tmp_path / 'flights.snapshot')
+    write_snapshot(store, path)
+    with pytest.raises(ValueError):
+        open_snapshot(path).columns['DTIME'][0] = 1
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'flights.snapshot'
+    path.write_bytes(b'not a snapshot at all')
+    with pytest.raises(ValueError):
+        open_snapshot(str(path))
+
+
+def test_load_flight_store_rebuilds_a_stale_snapshot(tmp_path):
+    database = str(tmp_path / 'flights.csv')
+    write_flights(database, 200, seed=1)
+    first = load_flight_store(database)
+    assert os.path.exists(snapshot_path(database)) and hasattr(first, 'buffer')
+    write_flights(database, 300, seed=1)
+    # newer than the snapshot, whatever the file system's timestamp resolution
+    mtime = os.path.getmtime(snapshot_path(database)) + 10
+    os.utime(database, (mtime, mtime))
+    assert len(load_flight_store(database)) == 300
+    assert len(first) == 200
+
+
+def test_load_flight_store_rebuilds_for_a_csv_with_an_older_mtime(tmp_path):
+    database = str(tmp_path / 'flights.csv')
+    write_flights(database, 200, seed=1)
+    assert 'VN3' in load_flight_store(database).values('FLIGHT')
+    with open(database, encoding='utf-8') as f:
+        text = f.read()
+    with open(database, 'w', encoding='utf-8') as f:
+        f.write(text.replace('VN3,', 'VN9,'))
+    # deployed with a preserved mtime, older than the snapshot (rsync -t, cp -p)
+    os.utime(database, (0, 0))
+    flights = load_flight_store(database).values('FLIGHT')
+    assert 'VN3' not in flights and 'VN9' in flights
+    # and reused again while the CSV stays the same
+    assert load_flight_store(database).source == [os.path.getsize(database), 0]
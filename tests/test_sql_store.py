@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from benchmarks.generate import generate_flights, write_flights
+from main import QuestionAnswering
+from modules.database import FlightStore
+from modules.sql_store import SQLFlightStore, open_sql_store
+
+SELECTIONS = [
+    ([], None),
+    ([('DEST', 'HUE')], None),
+    ([('SOURCE', 'HN'), ('DEST', 'HUE')], None),
+    ([('DEST', 'HUE')], 'VJ'),
+    ([('FLIGHT', 'VN4')], None),
+    ([('FLIGHT', 'XX1')], None)
+]
+
+
+@pytest.fixture(scope='module')
+def stores():
+    memory = FlightStore.from_records(generate_flights(2000, seed=1))
+    sql = SQLFlightStore.from_store(memory, ':memory:')
+    yield memory, sql
+    sql.close()
+
+
+def _trace(store):
+    statements = []
+    for connection in list(store.pool._idle.queue):
+        connection.set_trace_callback(statements.append)
+    return statements
+
+
+@pytest.mark.parametrize('predicates, airline', SELECTIONS)
+def test_select_matches_the_memory_store(stores, predicates, airline):
+    memory, sql = stores
+    expected = memory.select(predicates, airline)
+    rows = sql.select(predicates, airline)
+    assert len(rows) == len(expected)
+    assert rows.empty == expected.empty
+    assert rows.records() == expected.records()
+    for offset, limit in [(0, 3), (5, None), (len(expected), 2), (len(expected) + 4, None)]:
+        assert rows.page(offset, limit).records() == expected.page(offset, limit).records()
+        assert len(rows.page(offset, limit)) == len(expected.page(offset, limit))
+
+
+def test_empty_uses_the_count_not_a_full_fetch(stores):
+    _, sql = stores
+    statements = _trace(sql)
+    rows = sql.select([('DEST', 'HUE')])
+    assert not rows.empty
+    assert len(rows) > 5
+    assert len(rows.page(0, 5).records()) == 5
+    assert [statement.split()[1] for statement in statements] == ['COUNT(*)', 'FLIGHT,']
+    assert 'LIMIT 5' in statements[1]
+
+
+def test_answers_only_fetch_the_rendered_page(tmp_path):
+    database = str(tmp_path / 'flights.csv')
+    write_flights(database, 5000)
+    qa = QuestionAnswering(database, max_rows=5, sql_database_path=str(tmp_path / 'f.sqlite'))
+    statements = _trace(qa.database)
+    answer = qa.answer('Máy bay nào bay đến Huế ?')
+    assert answer['output'].endswith('trên tổng số {} kết quả)'.format(answer['row_count']))
+    assert len(statements) == 2 and 'LIMIT 5 OFFSET 0' in statements[1]
+    del statements[:]
+    qa.answer('Máy bay VN4 có xuất phát từ Đà Nẵng không ?')['output']
+    assert len(statements) == 1 and statements[0].startswith('SELECT COUNT(*)')
+    qa.database.close()
+
+
+@pytest.mark.parametrize('options', [{'reload_interval': 1.0}, {'delta_dir': 'deltas'}])
+def test_sql_database_rejects_reload_options(tmp_path, options):
+    with pytest.raises(ValueError):
+        QuestionAnswering(str(tmp_path / 'flights.csv'),
+                          sql_database_path=str(tmp_path / 'f.sqlite'), **options)
+
+
+def test_open_sql_store_rebuilds_for_a_csv_with_an_older_mtime(tmp_path):
+    database = str(tmp_path / 'flights.csv')
+    path = str(tmp_path / 'flights.sqlite')
+    write_flights(database, 200, seed=1)
+    store = open_sql_store(database, path)
+    assert len(store.select([('FLIGHT', 'VN3')])) == 1
+    store.close()
+    with open(database, encoding='utf-8') as f:
+        text = f.read()
+    with open(database, 'w', encoding='utf-8') as f:
+        f.write(text.replace('VN3,', 'VN9,'))
+    # deployed with a preserved mtime, older than the SQLite file (rsync -t, cp -p)
+    os.utime(database, (0, 0))
+    store = open_sql_store(database, path)
+    assert store.select([('FLIGHT', 'VN3')]).empty
+    assert store.source == [os.path.getsize(database), 0]
+    store.close()
+
+
+@pytest.mark.parametrize('text, message', [
+    ('FLIGHT,DTIME\nVN1,8:00\n', ': missing ATIME, RUNTIME, SOURCE, DEST columns'),
+    ('FLIGHT,DTIME,ATIME,RUNTIME,SOURCE,DEST\nVN1,8:00,9:00,1:00,HN,HUE\nVN2,8:00\n',
+     ':3: expected 6 fields')
+])
+def test_from_csv_rejects_incomplete_files(tmp_path, text, message):
+    database = tmp_path / 'flights.csv'
+    database.write_text(text, encoding='utf-8')
+    with pytest.raises(ValueError) as error:
+        SQLFlightStore.from_csv(str(database), str(tmp_path / 'flights.sqlite'))
+    assert str(error.value) == str(database) + message
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import threading
+
+from modules import startup
+
+
+def test_lazy_import_waits_for_a_module_another_thread_is_importing(tmp_path, monkeypatch):
+    # the module is visible in sys.modules long before its last line has run
+    (tmp_path / 'slow_lazy_module.py').write_text(
+        'import time\ntime.sleep(0.2)\nVALUE = 42\n', encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'slow_lazy_module', raising=False)
+    monkeypatch.delitem(startup.import_times, 'slow_lazy_module', raising=False)
+    values = []
+    errors = []
+
+    def run():
+        try:
+            values.append(startup.lazy_import('slow_lazy_module').VALUE)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert values == [42] * 8
+    assert 'slow_lazy_module' in startup.import_times
+
+
+def test_lazy_import_returns_loaded_modules():
+    assert startup.lazy_import('threading') is threading
+
+
+def test_report_lists_imports_and_events():
+    startup.mark('test event')
+    assert 'test event' in startup.report()
+
+
+def test_main_defers_underthesea_and_numpy():
+    code = ('import sys, main; qa = main.QuestionAnswering("input/database.csv"); '
+            'print("underthesea" in sys.modules, "numpy" in sys.modules)')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+    assert output.split() == [b'False', b'False']
@@ -0,0 +1,57 @@
+import pytest
+
+from modules.tokenizer import Tokenizer
+
+
+@pytest.mark.parametrize('tokens, merged', [
+    (['Hãy', 'cho', 'biết', 'mã_hiệu'], ['Hãy', 'cho_biết', 'mã_hiệu']),
+    (['lúc', 'mấy', 'giờ', '?'], ['lúc', 'mấy_giờ', '?']),
+    (['mất', '1', 'giờ'], ['mất', '1_giờ']),
+    (['mất', '12', 'giờ'], ['mất', '12_giờ']),
+    (['hãng', 'hàng_không', 'VietJetAir'], ['hãng_hàng_không', 'VietJetAir']),
+    (['lúc', '13', ':', '30HR', '?'], ['lúc', '13:30HR', '?']),
+    # only the first colon is joined, and a merge pair right after it is joined first
+    (['1', ':', '2', 'giờ', ':', '3'], ['1:2_giờ', ':', '3']),
+    (['giờ', '1'], ['giờ', '1']),
+    (['một', 'giờ'], ['một', 'giờ'])
+])
+def test_merge_tokens(tokens, merged):
+    assert Tokenizer().merge_tokens(tokens) == merged
+
+
+def test_rewrites_run_in_one_pass():
+    tokenizer = Tokenizer()
+    pattern = tokenizer.rewrite_pattern()
+    rewritten = pattern.sub(lambda match: tokenizer._rewrites[match.group()],
+                            'Thời gian Máy bay của hãng VietJet Air có mất 2 giờ không')
+    assert rewritten.split() == ['Máy', 'bay', 'hãng', 'VietJetAir', '2', 'giờ', 'không']
+    assert Tokenizer.rewrite_pattern() is pattern
+
+
+@pytest.mark.parametrize('question, tokens', [
+    ('Máy bay nào bay từ Đà Nẵng đến Huế mất 3 giờ ?',
+     ['Máy_bay', 'nào', 'bay', 'từ', 'Đà_Nẵng', 'đến', 'Huế', '3_giờ', '?']),
+    ('Có Máy bay nào xuất phát từ Hải Phòng không ?',
+     ['Máy_bay', 'nào', 'xuất_phát', 'từ', 'Hải_Phòng', '?']),
+    ('Máy bay nào đến thành phố Huế lúc 13:30HR ?',
+     ['Máy_bay', 'nào', 'đến', 'thành_phố', 'Huế', 'lúc', '13:30HR', '?'])
+])
+@pytest.mark.parametrize('backend', Tokenizer.BACKENDS)
+def test_tokenize(backend, question, tokens):
+    assert Tokenizer(backend=backend).tokenize(question) == tokens
+
+
+def test_fingerprint_follows_the_rules():
+    class Extended(Tokenizer):
+        MERGES = Tokenizer.MERGES + [('hạ', 'cánh')]
+
+    assert Tokenizer().rules_fingerprint() == Tokenizer().rules_fingerprint()
+    assert Extended().rules_fingerprint() != Tokenizer().rules_fingerprint()
+    assert Tokenizer(backend='trie').rules_fingerprint() != Tokenizer().rules_fingerprint()
+    assert Extended().merge_tokens(['hạ', 'cánh']) == ['hạ_cánh']
+    assert Tokenizer().merge_tokens(['hạ', 'cánh']) == ['hạ', 'cánh']
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Tokenizer(backend='spacy')